@@ -0,0 +1,248 @@
+"""
+Streaming abuse detector for spins, postbacks and referrals.
+
+Every event is counted against a sliding window per key (telegram id, IP, offer id, referrer):
+a ring of BUCKETS counters covering the rule's window, advanced lazily on the next event, so a
+hit costs O(1) time and each key a fixed few hundred bytes. Keys are kept in an LRU capped at
+ABUSE_MAX_KEYS per rule, which bounds memory whatever the traffic.
+
+A key that goes over its rule's limit is flagged and, with ABUSE_SOFT_BLOCK, refused (429 on the
+API, no referral credit in the bot) for ABUSE_BLOCK_SECONDS. Flags are queued in memory and written
+to `abuse_flags` in one batch per ABUSE_FLUSH_SECONDS, like app.activity.
+
+Windows are per process: with several workers a key's events are spread over them, so each worker
+sees roughly its share. Limits are meant to catch bursts far above human rates, not to meter.
+Blocks are not: a worker that blocks a key also sets an app.shared flag for ABUSE_BLOCK_SECONDS,
+and every worker (and the bot) refuses keys flagged there.
+
+IP rules are keyed on client_ip(request). When the address is still a trusted proxy's own (see
+FORWARDED_ALLOW_IPS), the IP rules are skipped instead of lumping every user behind it together.
+
+Rules can be overridden with ABUSE_RULES, a JSON object of {"rule": [limit, window_seconds]}.
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, shared, writer
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.postbacks import PrefixTrie
+
+# Buckets per window; the window slides in steps of window_seconds / BUCKETS
+BUCKETS = 12
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    limit: int             # Events allowed per window; one more flags the key
+    window_seconds: float
+
+
+DEFAULT_RULES = {
+    "spin_user": (60, 60.0),         # A spin animation alone takes seconds
+    "spin_ip": (600, 60.0),          # Shared NAT/carrier IPs
+    "postback_user": (20, 3600.0),   # Offer completions credited to one user
+    "postback_offer": (300, 60.0),   # One offer completing for many users at once
+    "postback_ip": (1200, 60.0),     # One source replaying postbacks
+    "referral": (30, 3600.0),        # New users signing up under one referrer
+}
+
+
+def compile_rules(raw: str) -> Dict[str, Rule]:
+    try:
+        overrides = json.loads(raw) if raw.strip() else {}
+    except json.JSONDecodeError as e:
+        raise ValueError(f"ABUSE_RULES is not valid JSON: {e}")
+    unknown = set(overrides) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"ABUSE_RULES has unknown rules: {sorted(unknown)}")
+    rules = {}
+    for name, default in DEFAULT_RULES.items():
+        limit, window = overrides.get(name, default)
+        if int(limit) < 1 or float(window) <= 0:
+            raise ValueError(f"ABUSE_RULES: {name} needs a positive limit and window")
+        rules[name] = Rule(name, int(limit), float(window))
+    return rules
+
+
+def compile_proxies(raw: str) -> Optional[PrefixTrie]:
+    """
+    FORWARDED_ALLOW_IPS as a trie; None for "*" (every peer is a proxy).
+    """
+    hosts = [h.strip() for h in raw.split(",") if h.strip()]
+    if "*" in hosts:
+        return None
+    proxies = PrefixTrie()
+    for host in hosts:
+        try:
+            proxies.add(host)
+        except ValueError:
+            # uvicorn also accepts non-IP literals (unix sockets); they never match an IP
+            logging.warning(f"FORWARDED_ALLOW_IPS: ignoring {host!r}")
+    return proxies
+
+
+_proxies = compile_proxies(settings.FORWARDED_ALLOW_IPS)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    Key for the IP rules, or None (rules skipped) while the address is a proxy's: uvicorn leaves the
+    peer in place when no X-Forwarded-For came with it, and with "*" any peer may be the balancer.
+    """
+    if request.client is None:
+        return None
+    host = request.client.host
+    if _proxies is None:
+        return host if "x-forwarded-for" in request.headers else None
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    return None if address in _proxies else host
+
+
+class SlidingWindow:
+    """
+    Ring of per-bucket counts plus their running total. Buckets that fell out of the window since
+    the last event are zeroed on the next one; at most BUCKETS of them, so the cost stays O(1).
+    """
+    __slots__ = ("counts", "total", "tick")
+
+    def __init__(self):
+        self.counts = array("I", bytes(4 * BUCKETS))
+        self.total = 0
+        self.tick = 0
+
+    def add(self, tick: int) -> int:
+        gap = tick - self.tick
+        if gap >= BUCKETS:
+            for i in range(BUCKETS):
+                self.counts[i] = 0
+            self.total = 0
+        else:
+            for step in range(1, gap + 1):
+                slot = (self.tick + step) % BUCKETS
+                self.total -= self.counts[slot]
+                self.counts[slot] = 0
+        self.tick = max(tick, self.tick)
+        self.counts[self.tick % BUCKETS] += 1
+        self.total += 1
+        return self.total
+
+
+class AbuseDetector:
+    def __init__(self, rules: Dict[str, Rule], max_keys: int, block_seconds: float, soft_block: bool,
+                 enabled: bool = True):
+        self.rules = rules
+        self.max_keys = max_keys
+        self.block_seconds = block_seconds
+        self.soft_block = soft_block
+        self.enabled = enabled
+        self._windows: Dict[str, "OrderedDict[Hashable, SlidingWindow]"] = {name: OrderedDict() for name in rules}
+        # (rule, key) -> monotonic deadline; while live the key is blocked (or, flag-only, not re-flagged)
+        self._flagged: "OrderedDict[Tuple[str, Hashable], float]" = OrderedDict()
+        self._pending: List[dict] = []
+
+    def _hit(self, rule: Rule, key: Hashable, now: float) -> bool:
+        deadline = self._flagged.get((rule.name, key))
+        if deadline is not None:
+            if deadline > now:
+                return not self.soft_block
+            del self._flagged[(rule.name, key)]
+
+        windows = self._windows[rule.name]
+        window = windows.get(key)
+        if window is None:
+            window = windows[key] = SlidingWindow()
+            if len(windows) > self.max_keys:
+                windows.popitem(last=False)
+        else:
+            windows.move_to_end(key)
+        count = window.add(int(now * BUCKETS / rule.window_seconds))
+        if count <= rule.limit:
+            return True
+
+        self._flagged[(rule.name, key)] = now + self.block_seconds
+        if self.soft_block:
+            shared.state.set_flag_nowait(_flag_key(rule.name, key), self.block_seconds)
+        if len(self._flagged) > self.max_keys:
+            self._flagged.popitem(last=False)
+        # Bounded like the windows; a flood of new offenders between flushes keeps the first ones
+        if len(self._pending) < self.max_keys:
+            self._pending.append(dict(
+                rule=rule.name, key=str(key), count=count, blocked=self.soft_block, created_at=datetime.utcnow(),
+            ))
+        logging.warning(f"Abuse flag: {rule.name}={key} count={count} limit={rule.limit}/{rule.window_seconds:g}s")
+        return not self.soft_block
+
+    async def allow(self, *events: Tuple[str, Optional[Hashable]], now: Optional[float] = None) -> bool:
+        """
+        Count one event against each (rule, key) pair; None keys are skipped. Returns False if any
+        key is soft-blocked, here or by another worker. Every pair is counted even when an earlier
+        one already blocks.
+        """
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        events = [(rule_name, key) for rule_name, key in events if key is not None]
+        allowed = True
+        for rule_name, key in events:
+            if not self._hit(self.rules[rule_name], key, now):
+                allowed = False
+        if allowed and self.soft_block and shared.state.is_shared:
+            for rule_name, key in events:
+                if await shared.state.has_flag(_flag_key(rule_name, key)):
+                    return False
+        return allowed
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        rows, self._pending = self._pending, []
+        try:
+            async with AsyncSessionLocal() as db:
+                await writer.run(db, _write_flags, rows)
+        except Exception:
+            # Retry with the next batch, within the same bound
+            self._pending = (rows + self._pending)[:self.max_keys]
+            raise
+        return len(rows)
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Abuse flag flush failed")
+
+
+def _flag_key(rule_name: str, key: Hashable) -> str:
+    return f"abuse:{rule_name}:{key}"
+
+
+async def _write_flags(db: AsyncSession, rows: List[dict]):
+    await db.execute(insert(models.AbuseFlag), rows)
+
+
+detector = AbuseDetector(
+    compile_rules(settings.ABUSE_RULES),
+    max_keys=settings.ABUSE_MAX_KEYS,
+    block_seconds=settings.ABUSE_BLOCK_SECONDS,
+    soft_block=settings.ABUSE_SOFT_BLOCK,
+    enabled=settings.ABUSE_DETECTION_ENABLED,
+)
@@ -0,0 +1,62 @@
+"""
+Coalesced last-seen tracking.
+
+Requests only record a touch in memory; a background loop writes all touches since the previous
+flush as one batched UPDATE. Cost is O(users active in the interval), not one write per request.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, writer
+from app.database import AsyncSessionLocal
+
+_users = models.User.__table__
+_touch_statement = (
+    update(_users)
+    .where(_users.c.telegram_id == bindparam("b_telegram_id"))
+    .values(last_active_at=bindparam("b_last_active_at"))
+)
+
+
+async def _write_touches(db: AsyncSession, rows):
+    await db.execute(_touch_statement, rows)
+
+
+class ActivityTracker:
+    def __init__(self):
+        self._touched: Dict[int, datetime] = {}
+
+    def touch(self, telegram_id: int) -> None:
+        # Repeat touches within an interval collapse into one row
+        self._touched[telegram_id] = datetime.utcnow()
+
+    async def flush(self) -> int:
+        if not self._touched:
+            return 0
+        touched, self._touched = self._touched, {}
+        rows = [{"b_telegram_id": tid, "b_last_active_at": ts} for tid, ts in touched.items()]
+        try:
+            async with AsyncSessionLocal() as db:
+                await writer.run(db, _write_touches, rows)
+        except Exception:
+            # Put them back for the next flush, keeping any newer touch
+            for tid, ts in touched.items():
+                self._touched.setdefault(tid, ts)
+            raise
+        return len(rows)
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Activity flush failed")
+
+
+tracker = ActivityTracker()
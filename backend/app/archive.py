@@ -0,0 +1,255 @@
+"""
+Cold storage for append-only history tables (rewards, task_completions).
+
+Rows older than ARCHIVE_RETENTION_DAYS are moved, oldest id first and ARCHIVE_CHUNK_SIZE at a time,
+into gzip NDJSON files partitioned by day:
+
+    <ARCHIVE_DIR>/<table>/<YYYY>/<MM>/<DD>/<first_id>-<last_id>.ndjson.gz
+
+Files are written before the transaction that records them in `archive_partitions` (the manifest)
+and deletes the hot rows, so a crash leaves at worst an unreferenced file that the retry
+overwrites. Each partition's user ids go to `archive_partition_users`, so a user's history
+opens only the files holding their rows. Archived transaction ids go to the key-only `archived_transactions` table and
+per-user completion counts to `archived_task_counts`, so duplicate postbacks stay rejected and
+wheel unlocks keep counting old completions.
+
+Runs as a bot scheduler job or standalone:
+
+    python -m app.archive
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import models, writer
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+JOB_NAME = "archive_history"
+
+TABLES = {
+    "rewards": models.Reward,
+    "task_completions": models.TaskCompletion,
+}
+
+
+def archive_dir() -> str:
+    if settings.ARCHIVE_DIR:
+        return settings.ARCHIVE_DIR
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archive")
+
+
+def partition_path(table_name: str, day, first_id: int, last_id: int) -> str:
+    return f"{table_name}/{day:%Y/%m/%d}/{first_id}-{last_id}.ndjson.gz"
+
+
+def write_partition(path: str, rows: List[Dict[str, Any]]):
+    full_path = os.path.join(archive_dir(), path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = full_path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=datetime.isoformat, separators=(",", ":")))
+            f.write("\n")
+    os.replace(tmp_path, full_path)
+
+
+def read_partition(path: str) -> List[Dict[str, Any]]:
+    rows = []
+    with gzip.open(os.path.join(archive_dir(), path), "rt", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+            rows.append(row)
+    return rows
+
+
+async def _load_chunk(db: AsyncSession, table_name: str, cutoff: datetime, limit: int):
+    """
+    Oldest rows by primary key, stopping at the first one newer than the cutoff. Walking the PK
+    instead of filtering on created_at keeps the hot tables free of another index.
+    """
+    model = TABLES[table_name]
+    columns = list(model.__table__.c)
+    query = select(*columns).order_by(model.id).limit(limit)
+    if model is models.TaskCompletion:
+        query = query.add_columns(models.Task.cpa_payout).outerjoin(models.Task, models.Task.id == model.task_id)
+    result = await db.execute(query)
+
+    rows, payouts = [], []
+    for record in result.all():
+        if record.created_at is None or record.created_at >= cutoff:
+            break
+        rows.append({column.name: getattr(record, column.name) for column in columns})
+        payouts.append(getattr(record, "cpa_payout", None) or 0.0)
+    return rows, payouts
+
+
+async def _commit_chunk(db: AsyncSession, table_name: str, partitions: List[dict], ids: List[int],
+                        transaction_ids: List[str], user_counts: Dict[int, int]):
+    for partition in partitions:
+        user_ids = partition.pop("user_ids")
+        db_partition = models.ArchivePartition(table_name=table_name, **partition)
+        db.add(db_partition)
+        await db.flush()
+        db.add_all([models.ArchivePartitionUser(user_id=uid, partition_id=db_partition.id) for uid in user_ids])
+    if transaction_ids:
+        db.add_all([models.ArchivedTransaction(transaction_id=tid) for tid in transaction_ids])
+    if user_counts:
+        Counts = models.ArchivedTaskCount
+        result = await db.execute(select(Counts.user_id).where(Counts.user_id.in_(list(user_counts))))
+        existing = set(result.scalars().all())
+        if existing:
+            table = Counts.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.user_id == bindparam("b_user_id"))
+                .values(count=table.c.count + bindparam("b_count")),
+                [{"b_user_id": uid, "b_count": user_counts[uid]} for uid in existing],
+            )
+        db.add_all([Counts(user_id=uid, count=n) for uid, n in user_counts.items() if uid not in existing])
+    model = TABLES[table_name]
+    await db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+    await db.flush()
+
+
+async def archive_table(table_name: str, cutoff: datetime, chunk_size: Optional[int] = None) -> int:
+    """
+    Move every row of `table_name` created before `cutoff` to cold storage. Returns rows moved.
+    """
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            rows, payouts = await _load_chunk(db, table_name, cutoff, chunk_size)
+            # End the read transaction before the (possibly slow) file writes
+            await db.rollback()
+            if not rows:
+                break
+
+            by_day = defaultdict(list)
+            for row, payout in zip(rows, payouts):
+                by_day[row["created_at"].date()].append((row, payout))
+
+            partitions = []
+            for day, entries in sorted(by_day.items()):
+                day_rows = [row for row, _ in entries]
+                path = partition_path(table_name, day, day_rows[0]["id"], day_rows[-1]["id"])
+                await asyncio.to_thread(write_partition, path, day_rows)
+                partitions.append(dict(
+                    path=path,
+                    first_id=day_rows[0]["id"],
+                    last_id=day_rows[-1]["id"],
+                    min_created_at=min(row["created_at"] for row in day_rows),
+                    max_created_at=max(row["created_at"] for row in day_rows),
+                    row_count=len(day_rows),
+                    payout_total=sum(payout for _, payout in entries),
+                    user_ids=sorted({row["user_id"] for row in day_rows if row["user_id"] is not None}),
+                ))
+
+            transaction_ids, user_counts = [], {}
+            if table_name == "task_completions":
+                transaction_ids = [row["transaction_id"] for row in rows if row["transaction_id"]]
+                user_counts = dict(Counter(row["user_id"] for row in rows if row["user_id"] is not None))
+
+            await writer.run(db, _commit_chunk, table_name, partitions, [row["id"] for row in rows],
+                             transaction_ids, user_counts)
+            total += len(rows)
+            if len(rows) < chunk_size:
+                break
+    return total
+
+
+async def archive_old_rows(now: Optional[datetime] = None) -> int:
+    """
+    Scheduler job: archive all history tables past the retention window.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=settings.ARCHIVE_RETENTION_DAYS)
+    total = 0
+    for table_name in TABLES:
+        moved = await archive_table(table_name, cutoff)
+        if moved:
+            logging.info(f"Archived {moved} {table_name} rows older than {cutoff:%Y-%m-%d}")
+        total += moved
+    return total
+
+
+async def get_history(db: AsyncSession, table_name: str, user_id: int, limit: int,
+                      before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    A user's rows newest first, hot table then archive partitions. Archived ids are always lower
+    than hot ones, so the two sources concatenate without a merge.
+    """
+    model = TABLES[table_name]
+    columns = list(model.__table__.c)
+    query = select(*columns).where(model.user_id == user_id).order_by(model.id.desc()).limit(limit)
+    if before is not None:
+        query = query.where(model.created_at < before)
+    result = await db.execute(query)
+    items = [dict(record._mapping, archived=False) for record in result.all()]
+    if len(items) >= limit:
+        return items
+
+    Partition, PartitionUser = models.ArchivePartition, models.ArchivePartitionUser
+    query = (
+        select(Partition.path)
+        .join(PartitionUser, PartitionUser.partition_id == Partition.id)
+        .where(PartitionUser.user_id == user_id, Partition.table_name == table_name)
+        .order_by(Partition.last_id.desc())
+    )
+    if before is not None:
+        query = query.where(Partition.min_created_at < before)
+    result = await db.execute(query)
+    for path in result.scalars().all():
+        try:
+            rows = await asyncio.to_thread(read_partition, path)
+        except FileNotFoundError:
+            logging.warning(f"Archive partition missing: {path}")
+            continue
+        matches = [
+            row for row in rows
+            if row["user_id"] == user_id and (before is None or row["created_at"] < before)
+        ]
+        for row in reversed(matches):
+            items.append(dict(row, archived=True))
+            if len(items) >= limit:
+                return items
+    return items
+
+
+async def get_archived_totals(db: AsyncSession, table_name: str):
+    """
+    (row_count, payout_total) already moved to cold storage for a table.
+    """
+    Partition = models.ArchivePartition
+    result = await db.execute(
+        select(func.sum(Partition.row_count), func.sum(Partition.payout_total))
+        .where(Partition.table_name == table_name)
+    )
+    row_count, payout_total = result.one()
+    return row_count or 0, payout_total or 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move old rewards/task_completions to cold storage")
+    parser.add_argument("--retention-days", type=float, default=settings.ARCHIVE_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    cutoff = datetime.utcnow() - timedelta(days=args.retention_days)
+    for table_name in TABLES:
+        print(f"{table_name}: {await archive_table(table_name, cutoff)} rows archived")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
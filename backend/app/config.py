@@ -13,6 +13,86 @@ class Settings(BaseSettings):
     ALLOW_ORIGINS: str = "*"  # Comma-separated list of origins or "*" for all (dev)
     SQL_ECHO: bool = False    # Disable verbose SQL logging by default
 
+    # Optional read replica for GET/admin reads (for SQLite: same file, separate read-only pool)
+    DATABASE_READ_URL: Optional[str] = None
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # Reads stick to the primary this long after a user's own write
+
+    # Optional Redis (requires the `redis` package) for cross-worker event fan-out
+    REDIS_URL: Optional[str] = None
+    EVENTS_KEEPALIVE_SECONDS: float = 15.0  # SSE comment ping so proxies keep idle streams open
+    EVENTS_MAX_STREAM_SECONDS: float = 300.0 # Streams end after this; EventSource reconnects by itself
+
+    # Activity tracking and inactivity reminders
+    ACTIVITY_FLUSH_SECONDS: float = 30.0  # last_active_at is written in one batch per interval
+    REMINDER_INACTIVE_HOURS: float = 24.0
+    REMINDER_SCAN_SECONDS: float = 600.0  # How often the reminder job runs (bot process)
+    REMINDER_CHUNK_SIZE: int = 1000
+
+    # Idempotency-Key support on /game/spin and /game/buy_spins
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    IDEMPOTENCY_CACHE_SIZE: int = 10000     # In-memory LRU entries per worker
+    IDEMPOTENCY_PURGE_SECONDS: float = 3600.0  # How often expired keys are deleted (bot process)
+
+    # Cold storage for old rewards/task_completions (app.archive, runs in the bot process)
+    ARCHIVE_DIR: Optional[str] = None      # Defaults to backend/archive
+    ARCHIVE_RETENTION_DAYS: float = 90.0   # Rows older than this leave the hot tables
+    ARCHIVE_CHUNK_SIZE: int = 5000         # Rows moved per transaction
+    ARCHIVE_INTERVAL_SECONDS: float = 86400.0
+
+    # Serialization fast paths (app.responses)
+    FAST_JSON: bool = False          # orjson for dict-returning routes (requires the `orjson` package)
+    TASKS_CACHE_SECONDS: float = 5.0 # GET /tasks/ body is served from cached bytes this long
+
+    # Streaming admin/CLI exports (app.export)
+    EXPORT_BATCH_SIZE: int = 1000  # Rows per server-side cursor fetch
+
+    # Wheel simulator (POST /admin/wheels/{tier}/simulate); runs in the API worker's threadpool
+    SIMULATION_MAX_SPINS: int = 1_000_000_000  # Runs stop (truncated) past this many spins
+
+    # Multi-worker mode (app.serve); more than one worker requires REDIS_URL for shared state
+    WEB_CONCURRENCY: Optional[int] = None   # Worker processes; defaults to the usable CPU count
+    DB_MAX_CONNECTIONS: Optional[int] = None # Server connection cap (PostgreSQL max_connections)
+    DB_RESERVED_CONNECTIONS: int = 10       # Kept free for the bot process, migrations and psql
+    DB_POOL_SIZE: int = 5                   # Per engine per worker; app.serve derives both from the cap
+    DB_MAX_OVERFLOW: int = 10
+    GRACEFUL_SHUTDOWN_SECONDS: float = 10.0 # Open connections (SSE) are closed after this on SIGTERM
+    # Proxies whose X-Forwarded-For is trusted for the client IP (uvicorn reads the same variable).
+    # Comma-separated IPs/CIDRs; "*" on Render, where only its load balancer can reach the service.
+    FORWARDED_ALLOW_IPS: str = "127.0.0.1,::1"
+
+    # Schema migrations (app.migrations) and worker boot
+    MIGRATE_ON_STARTUP: bool = False     # Dev convenience; deploys run `python -m app.migrations` once instead
+    STARTUP_BUDGET_SECONDS: float = 3.0  # Import + startup time above this is logged as a warning
+
+    # Postback gateway (app.postbacks): JSON object of per-network CIDR allowlists and HMAC secrets
+    POSTBACK_NETWORKS: str = ""  # Empty: token check only, from any IP
+
+    # Sliding-window abuse detector (app.abuse) for spins, postbacks and referrals
+    ABUSE_DETECTION_ENABLED: bool = True
+    ABUSE_SOFT_BLOCK: bool = True        # False: only record flags, never refuse
+    ABUSE_BLOCK_SECONDS: float = 300.0
+    ABUSE_MAX_KEYS: int = 50000          # Tracked keys per rule (LRU), bounds memory
+    ABUSE_FLUSH_SECONDS: float = 30.0    # Flags are written in one batch per interval
+    ABUSE_RULES: str = ""                # JSON overrides, e.g. {"spin_user": [60, 60]}
+
+    # Outbox dispatcher (runs in the bot process)
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_CONCURRENCY: int = 10         # Parallel Bot API calls
+    OUTBOX_RATE_PER_SECOND: float = 25.0 # Telegram allows ~30 msg/s per bot
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_POLL_SECONDS: float = 1.0     # Idle wait when nothing is pending
+    OUTBOX_LEASE_SECONDS: float = 60.0   # Claimed rows are reclaimable after this (crashed dispatcher)
+    OUTBOX_RETENTION_DAYS: float = 7.0   # Sent/failed rows are deleted after this
+    OUTBOX_PURGE_SECONDS: float = 3600.0 # How often the purge job runs (bot process)
+
+    # Wheel config hot reload: seconds between checks of the config version row
+    WHEEL_CONFIG_POLL_SECONDS: float = 5.0
+
+    # Single-writer mode (SQLite): funnel all writes through one connection, batched per tick
+    WRITE_ACTOR_ENABLED: bool = False
+    WRITE_ACTOR_MAX_BATCH: int = 256     # Commands coalesced into one transaction
+    WRITE_ACTOR_QUEUE_SIZE: int = 10000  # Pending commands before submitters wait
+
     class Config:
         env_file = ".env"
 
@@ -1,13 +1,16 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update
-from app import models, schemas
+from sqlalchemy import update, func
+from app import models, schemas, writer
 
 async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int):
     result = await db.execute(select(models.User).where(models.User.telegram_id == telegram_id))
     return result.scalars().first()
 
 async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    return await writer.run(db, _create_user, user)
+
+async def _create_user(db: AsyncSession, user: schemas.UserCreate):
     # DEV MODE: Give 5 free spins to new users
     db_user = models.User(telegram_id=user.telegram_id, username=user.username, spins=5)
     db.add(db_user)
@@ -25,7 +28,7 @@ async def create_user(db: AsyncSession, user: schemas.UserCreate):
             db_referral = models.Referral(referrer_id=referrer.id, referred_id=db_user.id)
             db.add(db_referral)
 
-    await db.commit()
+    await db.flush()
     await db.refresh(db_user)
     return db_user
 
@@ -37,27 +40,38 @@ async def add_spins(db: AsyncSession, user_id: int, amount: int):
     """
     Atomic spin increment without committing; caller manages the transaction.
     """
-    await db.execute(
+    result = await db.execute(
         update(models.User)
         .where(models.User.id == user_id)
         .values(spins=models.User.spins + amount)
+        .returning(models.User)
     )
     # Do not commit here; maintain atomicity at the caller level
-    result = await db.execute(select(models.User).where(models.User.id == user_id))
     return result.scalars().first()
 
 async def complete_task(db: AsyncSession, user_id: int, task_id: int, transaction_id: str, reward_amount: int):
+    """
+    Record a completion and award spins. Returns None for an already processed transaction;
+    otherwise the completion, with `completion.user` holding the awarded balance.
+    """
+    return await writer.run(db, _complete_task, user_id, task_id, transaction_id, reward_amount)
+
+async def _complete_task(db: AsyncSession, user_id: int, task_id: int, transaction_id: str, reward_amount: int):
     # Check duplicate
     result = await db.execute(select(models.TaskCompletion).where(models.TaskCompletion.transaction_id == transaction_id))
     if result.scalars().first():
         return None # Already processed
+    if await db.get(models.ArchivedTransaction, transaction_id):
+        return None # Processed long ago, row moved to cold storage
 
     # Record completion
     completion = models.TaskCompletion(user_id=user_id, task_id=task_id, transaction_id=transaction_id)
     db.add(completion)
 
     # Award spins
-    await add_spins(db, user_id, reward_amount)
+    completion.user = await add_spins(db, user_id, reward_amount)
+    if completion.user:
+        enqueue_message(db, completion.user.telegram_id, f"🎉 You earned {reward_amount} spins from completing a task!")
     
     # Check referral qualification
     # Find if this user was referred
@@ -66,7 +80,90 @@ async def complete_task(db: AsyncSession, user_id: int, task_id: int, transactio
     if referral and not referral.is_qualified:
         referral.is_qualified = True
         # Award referrer
-        await add_spins(db, referral.referrer_id, 3) # Example: 3 spins for qualified referral
+        referrer = await add_spins(db, referral.referrer_id, 3) # Example: 3 spins for qualified referral
+        if referrer:
+            enqueue_message(db, referrer.telegram_id, "🎉 Your friend completed a task, you earned 3 spins!")
     
-    await db.commit()
+    await db.flush()
     return completion
+
+def enqueue_message(db: AsyncSession, chat_id: int, text: str):
+    """
+    Queue a bot notification in the caller's transaction; the outbox dispatcher sends it after commit.
+    """
+    message = models.OutboxMessage(chat_id=chat_id, text=text)
+    db.add(message)
+    return message
+
+# Config version row bumped on every wheel publish
+WHEELS_CONFIG = "wheels"
+
+async def count_completed_tasks(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(select(func.count(models.TaskCompletion.id)).where(models.TaskCompletion.user_id == user_id))
+    hot = result.scalar() or 0
+    # Completions moved to cold storage still count towards wheel unlocks
+    result = await db.execute(select(models.ArchivedTaskCount.count).where(models.ArchivedTaskCount.user_id == user_id))
+    return hot + (result.scalar() or 0)
+
+async def get_config_version(db: AsyncSession, name: str) -> int:
+    result = await db.execute(select(models.ConfigVersion.version).where(models.ConfigVersion.name == name))
+    return result.scalar() or 0
+
+async def bump_config_version(db: AsyncSession, name: str) -> int:
+    """
+    Increment the version row for a hot-reloadable config without committing; caller manages the transaction.
+    """
+    result = await db.execute(
+        update(models.ConfigVersion)
+        .where(models.ConfigVersion.name == name)
+        .values(version=models.ConfigVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(models.ConfigVersion(name=name, version=1))
+        await db.flush()
+    return await get_config_version(db, name)
+
+async def get_latest_wheels(db: AsyncSession):
+    # Highest version per tier
+    latest = (
+        select(models.Wheel.tier, func.max(models.Wheel.version).label("version"))
+        .group_by(models.Wheel.tier)
+        .subquery()
+    )
+    result = await db.execute(
+        select(models.Wheel).join(
+            latest,
+            (models.Wheel.tier == latest.c.tier) & (models.Wheel.version == latest.c.version)
+        )
+    )
+    return result.scalars().all()
+
+async def get_wheel_versions(db: AsyncSession, tier: str):
+    result = await db.execute(
+        select(models.Wheel).where(models.Wheel.tier == tier).order_by(models.Wheel.version.desc())
+    )
+    return result.scalars().all()
+
+async def publish_wheel(db: AsyncSession, tier: str, wheel: schemas.WheelPublish):
+    """
+    Insert the next version of a tier's wheel and bump the wheels config version so workers reload.
+    """
+    return await writer.run(db, _publish_wheel, tier, wheel)
+
+async def _publish_wheel(db: AsyncSession, tier: str, wheel: schemas.WheelPublish):
+    result = await db.execute(select(func.max(models.Wheel.version)).where(models.Wheel.tier == tier))
+    next_version = (result.scalar() or 0) + 1
+
+    db_wheel = models.Wheel(
+        tier=tier,
+        version=next_version,
+        prizes=[prize.model_dump() for prize in wheel.prizes],
+        cost_per_spin=wheel.cost_per_spin,
+        required_tasks=wheel.required_tasks,
+        is_active=wheel.is_active,
+    )
+    db.add(db_wheel)
+    await bump_config_version(db, WHEELS_CONFIG)
+    await db.flush()
+    await db.refresh(db_wheel)
+    return db_wheel
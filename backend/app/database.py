@@ -1,8 +1,42 @@
+import time
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from app import shared
 from app.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO)
+def _pool_options(url: str) -> dict:
+    # Per-worker pool limits (app.serve sizes them so all workers fit under DB_MAX_CONNECTIONS)
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+
+engine = create_async_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO, **_pool_options(settings.DATABASE_URL))
+
+# Optional read replica. On SQLite point DATABASE_READ_URL at the same file to get a separate
+# read-only pool; WAL lets those readers run alongside the writer.
+if settings.DATABASE_READ_URL:
+    read_engine = create_async_engine(
+        settings.DATABASE_READ_URL, echo=settings.SQL_ECHO, **_pool_options(settings.DATABASE_READ_URL)
+    )
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine.sync_engine, "connect")
+        def _enable_wal(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.close()
+
+    if read_engine.dialect.name == "sqlite":
+        @event.listens_for(read_engine.sync_engine, "connect")
+        def _read_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+else:
+    read_engine = engine
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -10,8 +44,64 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+AsyncSessionReadLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
+# Read-your-writes: telegram_id -> monotonic deadline until which its reads go to the primary.
+# Mirrored as shared flags so the pin holds when the next read lands on another worker.
+_recent_writes: dict[str, float] = {}
+_RECENT_WRITES_MAX = 100_000
+
+def mark_write(telegram_id) -> None:
+    """
+    Pin a user's reads to the primary for READ_YOUR_WRITES_SECONDS after their own mutation.
+    """
+    if read_engine is engine or settings.READ_YOUR_WRITES_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if len(_recent_writes) >= _RECENT_WRITES_MAX:
+        # Keep the map bounded: drop expired entries, or everything if they're all live
+        for key in [k for k, deadline in _recent_writes.items() if deadline <= now] or list(_recent_writes):
+            del _recent_writes[key]
+    _recent_writes[str(telegram_id)] = now + settings.READ_YOUR_WRITES_SECONDS
+    shared.state.set_flag_nowait(f"ryw:{telegram_id}", settings.READ_YOUR_WRITES_SECONDS)
+
+async def _recently_wrote(telegram_id) -> bool:
+    deadline = _recent_writes.get(str(telegram_id))
+    if deadline is not None and deadline > time.monotonic():
+        return True
+    return shared.state.is_shared and await shared.state.has_flag(f"ryw:{telegram_id}")
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+# Explicit name for endpoints that mutate
+get_write_db = get_db
+
+async def read_session_factory(telegram_id=None):
+    """
+    Primary if the user wrote within the stickiness window (or there is no replica), else the replica.
+    """
+    if read_engine is engine or (telegram_id and await _recently_wrote(telegram_id)):
+        return AsyncSessionLocal
+    return AsyncSessionReadLocal
+
+async def get_read_db(request: Request):
+    """
+    Session on the replica, unless the requesting user wrote within the stickiness window.
+    The user is taken from the telegram_id path/query param or the X-Telegram-ID header.
+    """
+    telegram_id = (
+        request.path_params.get("telegram_id")
+        or request.query_params.get("telegram_id")
+        or request.headers.get("X-Telegram-ID")
+    )
+    session_factory = await read_session_factory(telegram_id)
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,307 @@
+"""
+Synthetic dataset generator and bulk loader for capacity testing.
+
+Builds a production-shaped population in NumPy and loads it through the fastest path the
+database offers: COPY via asyncpg on PostgreSQL, executemany of one prepared INSERT on SQLite,
+multi-row INSERT elsewhere.
+
+- Signups grow exponentially towards now, so recent days are busier than old ones.
+- Referrals follow preferential attachment: users who already referred friends are more likely
+  to refer again, giving the heavy-tailed fan-out of real referral trees.
+- Completions per user are negative binomial (most users do none or one, a few do dozens), with
+  offers picked from a Zipf-like popularity curve; spins and rewards scale with completions and
+  prizes are drawn from the built-in wheel.
+- Event times trail the signup by an exponential delay, and ids are assigned in time order like
+  an autoincrement key would be.
+
+New rows get ids above everything already present (including cold storage), so the generator can
+top up an existing database.
+
+    python -m app.datagen --users 1000000 --seed 1
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.future import select
+
+from app import migrations, models, wheels
+from app.database import Base, engine
+
+# Synthetic telegram ids start here; fits the 32-bit Integer column on PostgreSQL
+TELEGRAM_ID_BASE = 1_000_000_000
+
+DAY_SECONDS = 86400.0
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 100_000
+    tasks: int = 20
+    days: float = 180.0 # Span of signups, ending now
+    growth: float = 3.0 # Signup rate grows by e^growth across the span
+    referral_rate: float = 0.3 # Fraction of users who joined through a referral link
+    tasks_per_user: float = 1.2 # Mean completions per user (negative binomial)
+    task_dispersion: float = 0.5 # Lower means a heavier tail of power users
+    spins_per_user: float = 6.0 # Mean rewards (spins played) per user
+    completion_delay_days: float = 2.0 # Mean delay from signup to a completion
+    spin_delay_days: float = 3.0 # Mean delay from signup to a spin
+
+
+# table -> (column names, column arrays)
+Dataset = Dict[str, Tuple[List[str], List[np.ndarray]]]
+
+
+def _timestamps(start: np.datetime64, seconds: np.ndarray) -> np.ndarray:
+    return start + (seconds * 1e6).astype("timedelta64[us]")
+
+
+def generate(spec: DatasetSpec, now: datetime, offsets: Dict[str, int], seed: Optional[int] = None) -> Dataset:
+    """
+    Build every table as column arrays. `offsets` holds the highest existing id per table.
+    """
+    rng = np.random.default_rng(seed)
+    n = spec.users
+    span = spec.days * DAY_SECONDS
+    start = np.datetime64(now, "us") - np.timedelta64(int(span * 1e6), "us")
+
+    # Signup times: inverse CDF of an exponentially growing rate, already in id order
+    q = (np.arange(n) + rng.random(n)) / n
+    signed_up = span * np.log1p(q * np.expm1(spec.growth)) / spec.growth
+
+    # Referral tree by preferential attachment; pool holds one entry per user plus one per referral
+    referred = rng.random(n) < spec.referral_rate
+    picks = rng.random(n).tolist()
+    referrer = [-1] * n
+    pool: List[int] = []
+    for i, is_referred in enumerate(referred.tolist()):
+        if is_referred and pool:
+            r = pool[int(picks[i] * len(pool))]
+            referrer[i] = r
+            pool.append(r)
+        pool.append(i)
+    referrer = np.array(referrer, dtype=np.int64)
+    referred = referrer >= 0
+
+    # Tasks with a Zipf-like popularity curve
+    task_count = max(1, spec.tasks)
+    payouts = np.round(rng.uniform(0.2, 3.0, task_count), 2)
+    task_rewards = np.clip((payouts * 2).astype(np.int64), 1, 100) # As in cpagrip_postback
+    popularity = 1.0 / np.arange(1, task_count + 1)
+    popularity /= popularity.sum()
+
+    # Completions
+    dispersion = spec.task_dispersion
+    per_user = rng.negative_binomial(dispersion, dispersion / (dispersion + spec.tasks_per_user), n)
+    owner = np.repeat(np.arange(n), per_user)
+    done_at = np.minimum(signed_up[owner] + rng.exponential(spec.completion_delay_days * DAY_SECONDS, owner.size), span)
+    order = np.argsort(done_at, kind="stable")
+    completion_owner, completion_at = owner[order], done_at[order]
+    completion_task = rng.choice(task_count, size=owner.size, p=popularity)
+    completion_ids = offsets["task_completions"] + 1 + np.arange(owner.size)
+
+    # Rewards: more completions, more spins
+    scale = (1 + per_user) / (1 + spec.tasks_per_user)
+    spins_played = rng.poisson(spec.spins_per_user * scale)
+    owner = np.repeat(np.arange(n), spins_played)
+    spun_at = np.minimum(signed_up[owner] + rng.exponential(spec.spin_delay_days * DAY_SECONDS, owner.size), span)
+    order = np.argsort(spun_at, kind="stable")
+    reward_owner, reward_at = owner[order], spun_at[order]
+    wheel = wheels.DEFAULT_WHEEL
+    cumulative = np.asarray(wheel.cumulative, dtype=np.int64)
+    prize_index = np.searchsorted(cumulative, rng.integers(0, wheel.total, owner.size), side="right")
+    prize_types = np.array([p.prize_type for p in wheel.prizes], dtype=object)
+    prize_values = np.array([p.prize_value for p in wheel.prizes], dtype=object)
+    prize_points = np.array([float(p.prize_value) if p.prize_type == "points" else 0.0 for p in wheel.prizes])
+
+    # Users
+    user_ids = offsets["users"] + 1 + np.arange(n)
+    last_active = signed_up.copy()
+    np.maximum.at(last_active, completion_owner, completion_at)
+    np.maximum.at(last_active, reward_owner, reward_at)
+    usernames = np.array([f"user{uid}" for uid in user_ids.tolist()], dtype=object)
+    usernames[rng.random(n) < 0.3] = None # Not everyone has a public username
+    points = np.bincount(reward_owner, weights=prize_points[prize_index], minlength=n)
+
+    # Referrals, in signup order of the referred user
+    referred_index = np.flatnonzero(referred)
+    task_ids = offsets["tasks"] + 1 + np.arange(task_count)
+
+    return {
+        "tasks": (
+            ["id", "name", "description", "cpa_network_id", "reward_spins", "cpa_payout", "is_active"],
+            [
+                task_ids,
+                np.array([f"Synthetic offer {tid}" for tid in task_ids.tolist()], dtype=object),
+                np.full(task_count, "Generated by app.datagen", dtype=object),
+                np.array([f"synthetic_{tid}" for tid in task_ids.tolist()], dtype=object),
+                task_rewards,
+                payouts,
+                np.ones(task_count, dtype=bool),
+            ],
+        ),
+        "users": (
+            ["id", "telegram_id", "username", "spins", "points", "created_at", "last_active_at"],
+            [
+                user_ids,
+                TELEGRAM_ID_BASE + user_ids,
+                usernames,
+                rng.integers(0, 6, n),
+                points,
+                _timestamps(start, signed_up),
+                _timestamps(start, last_active),
+            ],
+        ),
+        "referrals": (
+            ["id", "referrer_id", "referred_id", "is_qualified", "created_at"],
+            [
+                offsets["referrals"] + 1 + np.arange(referred_index.size),
+                user_ids[referrer[referred_index]],
+                user_ids[referred_index],
+                per_user[referred_index] > 0,
+                _timestamps(start, signed_up[referred_index]),
+            ],
+        ),
+        "task_completions": (
+            ["id", "user_id", "task_id", "transaction_id", "created_at"],
+            [
+                completion_ids,
+                user_ids[completion_owner],
+                task_ids[completion_task],
+                np.array([f"syn-{cid}" for cid in completion_ids.tolist()], dtype=object),
+                _timestamps(start, completion_at),
+            ],
+        ),
+        "rewards": (
+            ["id", "user_id", "prize_type", "prize_value", "created_at"],
+            [
+                offsets["rewards"] + 1 + np.arange(reward_owner.size),
+                user_ids[reward_owner],
+                prize_types[prize_index],
+                prize_values[prize_index],
+                _timestamps(start, reward_at),
+            ],
+        ),
+    }
+
+
+# Parents before children
+LOAD_ORDER = ["tasks", "users", "referrals", "task_completions", "rewards"]
+
+
+async def max_ids(db_engine: AsyncEngine) -> Dict[str, int]:
+    offsets = {}
+    async with db_engine.connect() as conn:
+        for table_name in LOAD_ORDER:
+            table = Base.metadata.tables[table_name]
+            offsets[table_name] = (await conn.execute(select(func.max(table.c.id)))).scalar() or 0
+        # Archived rows left the hot tables but their ids must not be reused
+        Partition = models.ArchivePartition
+        result = await conn.execute(
+            select(Partition.table_name, func.max(Partition.last_id)).group_by(Partition.table_name)
+        )
+        for table_name, last_id in result.all():
+            if table_name in offsets:
+                offsets[table_name] = max(offsets[table_name], last_id or 0)
+    return offsets
+
+
+class BulkLoader:
+    def __init__(self, db_engine: AsyncEngine, batch_size: int = 50_000):
+        self.engine = db_engine
+        self.batch_size = batch_size
+        self.dialect = db_engine.dialect.name
+
+    async def load(self, table_name: str, columns: List[str], arrays: List[np.ndarray]) -> int:
+        total = len(arrays[0]) if arrays else 0
+        for offset in range(0, total, self.batch_size):
+            rows = list(zip(*[array[offset:offset + self.batch_size].tolist() for array in arrays]))
+            async with self.engine.begin() as conn:
+                if self.dialect == "postgresql" and self.engine.dialect.driver == "asyncpg":
+                    raw = await conn.get_raw_connection()
+                    await raw.driver_connection.copy_records_to_table(table_name, records=rows, columns=columns)
+                elif self.dialect == "sqlite":
+                    placeholders = ", ".join("?" for _ in columns)
+                    await conn.exec_driver_sql(
+                        f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})", rows
+                    )
+                else:
+                    table = Base.metadata.tables[table_name]
+                    await conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+        return total
+
+    async def finish(self):
+        async with self.engine.begin() as conn:
+            if self.dialect == "postgresql":
+                # Explicit ids bypassed the sequences
+                for table_name in LOAD_ORDER:
+                    await conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 1) FROM {table_name}))"
+                    ))
+            # Fresh statistics so the planner sees the new sizes
+            await conn.execute(text("ANALYZE"))
+
+
+async def run(spec: DatasetSpec, db_engine: AsyncEngine, seed: Optional[int] = None, batch_size: int = 50_000):
+    await migrations.upgrade(db_engine)
+
+    started = time.perf_counter()
+    dataset = generate(spec, datetime.utcnow(), await max_ids(db_engine), seed)
+    print(f"generated in {time.perf_counter() - started:.1f}s")
+
+    loader = BulkLoader(db_engine, batch_size)
+    load_started = time.perf_counter()
+    total = 0
+    for table_name in LOAD_ORDER:
+        columns, arrays = dataset[table_name]
+        table_started = time.perf_counter()
+        rows = await loader.load(table_name, columns, arrays)
+        elapsed = time.perf_counter() - table_started
+        print(f"{table_name:>16}: {rows:>10,} rows in {elapsed:6.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+        total += rows
+    await loader.finish()
+    elapsed = time.perf_counter() - load_started
+    print(f"{'total':>16}: {total:>10,} rows in {elapsed:6.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and bulk-load a synthetic population")
+    parser.add_argument("--users", type=int, default=DatasetSpec.users)
+    parser.add_argument("--tasks", type=int, default=DatasetSpec.tasks)
+    parser.add_argument("--days", type=float, default=DatasetSpec.days)
+    parser.add_argument("--referral-rate", type=float, default=DatasetSpec.referral_rate)
+    parser.add_argument("--tasks-per-user", type=float, default=DatasetSpec.tasks_per_user)
+    parser.add_argument("--spins-per-user", type=float, default=DatasetSpec.spins_per_user)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows per INSERT/COPY transaction")
+    parser.add_argument("--database-url", help="Load into this database instead of DATABASE_URL")
+    args = parser.parse_args()
+
+    spec = DatasetSpec(
+        users=args.users,
+        tasks=args.tasks,
+        days=args.days,
+        referral_rate=args.referral_rate,
+        tasks_per_user=args.tasks_per_user,
+        spins_per_user=args.spins_per_user,
+    )
+    db_engine = create_async_engine(args.database_url) if args.database_url else engine
+
+    async def _main():
+        try:
+            await run(spec, db_engine, args.seed, args.batch_size)
+        finally:
+            await db_engine.dispose()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Pub/sub hub for pushing per-user events (balance changes, spin results, task completions)
+to connected clients over SSE.
+
+Events fan out in-process by default. With Redis (app.shared's client, see REDIS_URL) they are
+published to Redis and every worker relays its channel pattern to its own subscribers, so a
+postback handled by one worker reaches a client connected to another.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+
+from app import shared
+
+CHANNEL_PREFIX = "events:"
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventHub:
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    @asynccontextmanager
+    async def subscription(self, topic: str):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[topic].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic, event_type: str, data: dict) -> None:
+        """
+        Fire-and-forget; never blocks the request that produced the event.
+        """
+        topic = str(topic)
+        message = format_sse(event_type, data)
+        if self._redis is None:
+            self._deliver(topic, message)
+            return
+        task = asyncio.create_task(self._redis.publish(CHANNEL_PREFIX + topic, message))
+        self._pending.add(task)
+        task.add_done_callback(self._publish_done)
+
+    def _publish_done(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.warning(f"Event publish failed: {task.exception()}")
+
+    def _deliver(self, topic: str, message: str):
+        for queue in self._subscribers.get(topic, ()):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than grow without bound
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def start(self):
+        """
+        Call after shared.state.start(); events stay in-process when it has no Redis client.
+        """
+        self._redis = shared.state.redis
+        if self._redis is not None:
+            self._listener = asyncio.create_task(self._relay())
+
+    async def _relay(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(CHANNEL_PREFIX + "*")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    self._deliver(message["channel"][len(CHANNEL_PREFIX):], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Event relay lost its Redis subscription; reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        # The client belongs to app.shared, which closes it
+        self._redis = None
+
+
+hub = EventHub()
@@ -0,0 +1,186 @@
+"""
+Streaming bulk export of users, rewards and task completions (finance reconciliation).
+
+Rows come off a server-side cursor EXPORT_BATCH_SIZE at a time and are encoded to CSV or NDJSON,
+optionally gzipped on the fly, so memory stays constant whatever the table size. For rewards and
+task_completions the date range also reads through cold-storage partitions (app.archive), which
+hold the oldest ids and are emitted first. Task completions carry the task name and cpa_payout.
+
+Served by GET /admin/export/{table}, or from the command line:
+
+    python -m app.export task_completions --since 2026-01-01 --until 2026-02-01 --gzip -o jan.csv.gz
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import archive, models
+from app.config import settings
+from app.database import AsyncSessionReadLocal
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+TABLES = {
+    "users": models.User,
+    "rewards": models.Reward,
+    "task_completions": models.TaskCompletion,
+}
+
+# Extra columns joined onto task completions
+TASK_COLUMNS = ["task_name", "cpa_payout"]
+
+
+def columns(table_name: str) -> List[str]:
+    names = [column.name for column in TABLES[table_name].__table__.c]
+    if table_name == "task_completions":
+        names += TASK_COLUMNS
+    return names
+
+
+def _query(table_name: str, since: Optional[datetime], until: Optional[datetime]):
+    model = TABLES[table_name]
+    query = select(*model.__table__.c).order_by(model.id)
+    if table_name == "task_completions":
+        query = query.add_columns(
+            models.Task.name.label("task_name"), models.Task.cpa_payout
+        ).outerjoin(models.Task, models.Task.id == model.task_id)
+    if since is not None:
+        query = query.where(model.created_at >= since)
+    if until is not None:
+        query = query.where(model.created_at < until)
+    return query
+
+
+async def _archived_rows(db: AsyncSession, table_name: str, since: Optional[datetime],
+                         until: Optional[datetime]) -> AsyncIterator[List[Dict[str, Any]]]:
+    if table_name not in archive.TABLES:
+        return
+    Partition = models.ArchivePartition
+    query = select(Partition.path).where(Partition.table_name == table_name).order_by(Partition.first_id)
+    if since is not None:
+        query = query.where(Partition.max_created_at >= since)
+    if until is not None:
+        query = query.where(Partition.min_created_at < until)
+    paths = (await db.execute(query)).scalars().all()
+
+    tasks = {}
+    if table_name == "task_completions":
+        # The tasks table is small; join archived rows against it in memory
+        result = await db.execute(select(models.Task.id, models.Task.name, models.Task.cpa_payout))
+        tasks = {row.id: (row.name, row.cpa_payout) for row in result.all()}
+
+    for path in paths:
+        rows = await asyncio.to_thread(archive.read_partition, path)
+        rows = [
+            row for row in rows
+            if (since is None or row["created_at"] >= since) and (until is None or row["created_at"] < until)
+        ]
+        if table_name == "task_completions":
+            for row in rows:
+                row["task_name"], row["cpa_payout"] = tasks.get(row["task_id"], (None, None))
+        if rows:
+            yield rows
+
+
+async def stream_rows(table_name: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      batch_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield lists of row dicts, at most `batch_size` per list for the hot table.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    async with AsyncSessionReadLocal() as db:
+        async for rows in _archived_rows(db, table_name, since, until):
+            yield rows
+        result = await db.stream(_query(table_name, since, until).execution_options(yield_per=batch_size))
+        async for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
+
+def _csv_chunk(rows: Iterable[Dict[str, Any]], fieldnames: List[str], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(rows: Iterable[Dict[str, Any]], fieldnames: List[str], header: bool) -> str:
+    return "".join(
+        json.dumps({name: row.get(name) for name in fieldnames}, default=str, separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+async def export(table_name: str, fmt: str = "csv", since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Encoded export body, one chunk per fetched batch. With `compress` the chunks form a gzip stream.
+    """
+    encode = _csv_chunk if fmt == "csv" else _ndjson_chunk
+    fieldnames = columns(table_name)
+    # wbits=31: gzip container, so the output is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    header = True
+    async for rows in stream_rows(table_name, since, until):
+        data = encode(rows, fieldnames, header).encode("utf-8")
+        header = False
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if header:
+        # No rows: still emit the CSV header
+        data = encode([], fieldnames, True).encode("utf-8")
+        yield compressor.compress(data) + compressor.flush() if compressor else data
+    elif compressor is not None:
+        yield compressor.flush()
+
+
+def filename(table_name: str, fmt: str, compress: bool) -> str:
+    return f"{table_name}.{fmt}" + (".gz" if compress else "")
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Stream a table export to a file or stdout")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--since", type=_parse_date, help="Inclusive lower bound on created_at (ISO date)")
+    parser.add_argument("--until", type=_parse_date, help="Exclusive upper bound on created_at (ISO date)")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    started = time.perf_counter()
+    written = 0
+    try:
+        async for chunk in export(args.table, args.format, args.since, args.until, args.gzip):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"{args.table}: {written} bytes in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
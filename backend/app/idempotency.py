@@ -0,0 +1,232 @@
+"""
+Idempotency keys for mutating game endpoints.
+
+A client retrying with the same `Idempotency-Key` gets the stored response instead of a second
+spend. Lookups go memory LRU -> Redis (app.shared's client, if any) -> `idempotency_keys`
+table, so a retry storm costs a cache hit and never touches the `users` row. The DB row is written
+in the same transaction as the mutation, which makes the key durable exactly when the spend is.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, shared, writer
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+REDIS_PREFIX = "idem:"
+# Session.info slot where replay() leaves its lookup for execute()
+_LOOKUP_INFO = "idempotency_lookup"
+
+
+def scope(endpoint: str, telegram_id: int, key: str) -> str:
+    # Keys are only unique per client, so namespace them by endpoint and user
+    return f"{endpoint}:{telegram_id}:{key}"
+
+
+def fingerprint(**params) -> str:
+    """
+    Digest of the request parameters a key was first used with; a retry must send the same ones.
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _check_fingerprint(stored: Optional[str], requested: Optional[str]):
+    # Rows written before fingerprints existed have none; they replay as before
+    if stored is not None and requested is not None and stored != requested:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was used with different parameters")
+
+
+async def _recorded(
+    db: AsyncSession, key: str, request_fingerprint: Optional[str], expired_before: Optional[datetime], fn, *args
+):
+    result = await fn(db, *args)
+    if expired_before is not None:
+        # The key's old row outlived its TTL but the purge job hasn't removed it yet. Only a row
+        # that is still expired goes, so a concurrent live insert still surfaces as a duplicate.
+        await db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key, models.IdempotencyKey.created_at < expired_before)
+        )
+    db.add(models.IdempotencyKey(key=key, fingerprint=request_fingerprint, response=result.model_dump(mode="json")))
+    # Surface a concurrent duplicate here, inside the command's savepoint
+    await db.flush()
+    return result
+
+
+class IdempotencyStore:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, fingerprint, response)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[Optional[str], asyncio.Future]] = {}
+
+    @property
+    def _redis(self):
+        # None without Redis: memory and DB only
+        return shared.state.redis
+
+    def _cache_get(self, key: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, response = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return stored_fingerprint, response
+
+    def _cache_put(self, key: str, stored_fingerprint: Optional[str], response: Dict[str, Any]):
+        self._cache[key] = (time.monotonic() + self.ttl_seconds, stored_fingerprint, response)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        """
+        (fingerprint, stored response) for a live key, else None.
+        """
+        entry, _ = await self._lookup(db, key)
+        return entry
+
+    async def replay(
+        self, db: AsyncSession, key: str, request_fingerprint: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Stored response for a retry of `key`, else None. Lets an endpoint answer retries before its
+        own checks (rate limits, gating reads); a following execute() on the same session reuses
+        this lookup instead of reading the key again. 422 if the key was used with other parameters.
+        """
+        stored, expired_before = await self._lookup(db, key)
+        if stored is not None:
+            _check_fingerprint(stored[0], request_fingerprint)
+            return stored[1]
+        db.info[_LOOKUP_INFO] = (key, expired_before)
+        return None
+
+    async def _lookup(
+        self, db: AsyncSession, key: str
+    ) -> Tuple[Optional[Tuple[Optional[str], Dict[str, Any]]], Optional[datetime]]:
+        """
+        Like get(), plus the TTL cutoff when the key only has an expired row in the table.
+        """
+        entry = self._cache_get(key)
+        if entry is not None:
+            return entry, None
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(REDIS_PREFIX + key)
+            except Exception as e:
+                logging.warning(f"Idempotency Redis lookup failed: {e}")
+                raw = None
+            if raw is not None:
+                stored = json.loads(raw)
+                # Entries cached before fingerprints were stored are the bare response
+                entry = (stored["fingerprint"], stored["response"]) if "response" in stored else (None, stored)
+                self._cache_put(key, *entry)
+                return entry, None
+
+        row = await db.get(models.IdempotencyKey, key)
+        if row is None:
+            return None, None
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        if row.created_at < cutoff:
+            return None, cutoff
+        await self._remember(key, row.fingerprint, row.response)
+        return (row.fingerprint, row.response), None
+
+    async def _remember(self, key: str, stored_fingerprint: Optional[str], response: Dict[str, Any]):
+        self._cache_put(key, stored_fingerprint, response)
+        if self._redis is not None:
+            try:
+                raw = json.dumps({"fingerprint": stored_fingerprint, "response": response})
+                await self._redis.set(REDIS_PREFIX + key, raw, ex=int(self.ttl_seconds))
+            except Exception as e:
+                logging.warning(f"Idempotency Redis store failed: {e}")
+
+    async def execute(
+        self, db: AsyncSession, key: Optional[str], fn, *args, request_fingerprint: Optional[str] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Run a write command at most once per key. Returns (result, replayed); replayed results are
+        the stored JSON dict, fresh ones whatever the command returned. A key reused with a
+        different `request_fingerprint` (see fingerprint()) is rejected with 422.
+        """
+        if key is None:
+            return await writer.run(db, fn, *args), False
+
+        looked_up = db.info.pop(_LOOKUP_INFO, None)
+        if looked_up is not None and looked_up[0] == key:
+            # replay() just missed; a duplicate that raced in since surfaces as IntegrityError below
+            stored, expired_before = None, looked_up[1]
+        else:
+            stored, expired_before = await self._lookup(db, key)
+        if stored is not None:
+            _check_fingerprint(stored[0], request_fingerprint)
+            return stored[1], True
+
+        # Concurrent duplicates in this worker wait for the first attempt
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            _check_fingerprint(inflight[0], request_fingerprint)
+            return await asyncio.shield(inflight[1]), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (request_fingerprint, future)
+        try:
+            try:
+                result = await writer.run(db, _recorded, key, request_fingerprint, expired_before, fn, *args)
+            except IntegrityError:
+                # Another worker committed this key first
+                await db.rollback()
+                stored = await self.get(db, key)
+                if stored is None:
+                    raise
+                future.set_result(stored[1])
+                _check_fingerprint(stored[0], request_fingerprint)
+                return stored[1], True
+            await self._remember(key, request_fingerprint, result.model_dump(mode="json"))
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Nobody else may be waiting; don't warn about an unretrieved exception
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+
+store = IdempotencyStore(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_TTL_SECONDS)
+
+
+async def _purge(db: AsyncSession, cutoff: datetime) -> int:
+    result = await db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.created_at < cutoff))
+    return result.rowcount
+
+
+async def purge_expired() -> int:
+    """
+    Delete keys past their TTL; run periodically by the scheduler.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    async with AsyncSessionLocal() as db:
+        return await writer.run(db, _purge, cutoff)
@@ -1,9 +1,19 @@
+import asyncio
+import logging
+import time
+
+# Boot clock for the startup budget: covers imports below plus the startup hook
+_boot_started = time.perf_counter()
+
 from fastapi import FastAPI
 from app.routers import users, tasks, game, auth, admin
-from app.database import engine, Base
+from app.database import engine, AsyncSessionLocal
+from app import wheels, writer, events, activity, idempotency, migrations, shared, abuse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 
+_imports_done = time.perf_counter()
+
 app = FastAPI(title="Wheel of Fortune MiniApp")
 
 # CORS for Frontend (configured via env ALLOW_ORIGINS, comma-separated or "*" for dev)
@@ -23,12 +33,49 @@ app.include_router(tasks.router)
 app.include_router(game.router)
 app.include_router(admin.router)
 
+# Long-running worker loops started on startup, cancelled on shutdown
+background_tasks: list[asyncio.Task] = []
+
 @app.on_event("startup")
 async def startup():
-    # Init DB Tables
-    async with engine.begin() as conn:
-        # await conn.run_sync(Base.metadata.drop_all) # RESET DB (Dev only)
-        await conn.run_sync(Base.metadata.create_all)
+    # Schema is migrated once per deploy (`python -m app.migrations`); workers only check the version row
+    startup_started = time.perf_counter()
+    await migrations.ensure_current(engine)
+
+    await shared.state.start(settings.REDIS_URL)
+    await events.hub.start()
+
+    if settings.WRITE_ACTOR_ENABLED:
+        writer.actor.start()
+
+    # Load wheel configs into memory, then watch the version row for publishes
+    async with AsyncSessionLocal() as db:
+        await wheels.registry.refresh(db, force=True)
+    background_tasks.append(asyncio.create_task(wheels.registry.poll(settings.WHEEL_CONFIG_POLL_SECONDS)))
+    background_tasks.append(asyncio.create_task(activity.tracker.run(settings.ACTIVITY_FLUSH_SECONDS)))
+    background_tasks.append(asyncio.create_task(abuse.detector.run(settings.ABUSE_FLUSH_SECONDS)))
+
+    imports, hooks = _imports_done - _boot_started, time.perf_counter() - startup_started
+    message = f"Worker ready: imports {imports:.2f}s, startup {hooks:.2f}s"
+    if imports + hooks > settings.STARTUP_BUDGET_SECONDS:
+        logging.warning(f"{message}, over the {settings.STARTUP_BUDGET_SECONDS:.1f}s startup budget")
+    else:
+        logging.info(message)
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+    # Last batch of touches and flags, written while the actor (if any) is still up
+    await activity.tracker.flush()
+    await abuse.detector.flush()
+
+    await writer.actor.stop()
+    await events.hub.stop()
+    await shared.state.stop()
 
 @app.get("/")
 async def root():
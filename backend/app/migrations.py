@@ -0,0 +1,196 @@
+"""
+Versioned schema migrations.
+
+Migrations run once per deploy as a separate step, before the workers start:
+
+    python -m app.migrations            # upgrade to the latest version
+    python -m app.migrations status
+
+Workers only read the highest applied version from `schema_migrations` on boot (one indexed
+query, no DDL or table inspection) and refuse to start on an older schema unless
+MIGRATE_ON_STARTUP is set.
+
+Steps must be idempotent: the baseline creates tables from the models, so a fresh database
+already has what later steps add, while an existing one gets only what it is missing.
+"""
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import Connection, func, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.future import select
+
+from app import models
+from app.config import settings
+from app.database import Base
+
+# Arbitrary key for pg_advisory_xact_lock, so concurrent runners apply each step once
+LOCK_KEY = 7_316_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def _add_column(conn: Connection, table_name: str, column_name: str):
+    if column_name in {c["name"] for c in inspect(conn).get_columns(table_name)}:
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column.type.compile(conn.dialect)}"))
+
+
+def _create_index(conn: Connection, table_name: str, index_name: str):
+    index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+    index.create(conn, checkfirst=True)
+
+
+def _baseline(conn: Connection):
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables[name] for name in BASELINE_TABLES])
+
+
+def _users_last_active_at(conn: Connection):
+    _add_column(conn, "users", "last_active_at")
+    conn.execute(text("UPDATE users SET last_active_at = created_at WHERE last_active_at IS NULL"))
+    _create_index(conn, "users", "ix_users_last_active_at")
+
+
+def _history_indexes(conn: Connection):
+    _create_index(conn, "rewards", "ix_rewards_user_id")
+    _create_index(conn, "task_completions", "ix_task_completions_user_id")
+    _create_index(conn, "task_completions", "ix_task_completions_task_id")
+
+
+def _abuse_flags(conn: Connection):
+    Base.metadata.tables["abuse_flags"].create(conn, checkfirst=True)
+
+
+def _idempotency_fingerprint(conn: Connection):
+    _add_column(conn, "idempotency_keys", "fingerprint")
+
+
+def _archive_partition_users(conn: Connection):
+    from app import archive
+
+    table = Base.metadata.tables["archive_partition_users"]
+    table.create(conn, checkfirst=True)
+    # Index partitions archived before this table existed (one pass over the archive)
+    partitions = conn.execute(text("SELECT id, path FROM archive_partitions")).all()
+    for partition_id, path in partitions:
+        try:
+            user_ids = {row["user_id"] for row in archive.read_partition(path) if row["user_id"] is not None}
+        except FileNotFoundError:
+            logging.warning(f"Archive partition missing: {path}")
+            continue
+        if user_ids:
+            conn.execute(table.insert(), [{"user_id": uid, "partition_id": partition_id} for uid in user_ids])
+
+
+# Tables as of the first versioned release; later tables get their own step
+BASELINE_TABLES = [
+    "users", "tasks", "referrals", "rewards", "task_completions", "wheels", "config_versions",
+    "outbox", "job_state", "idempotency_keys", "archive_partitions", "archived_transactions",
+    "archived_task_counts", "schema_migrations",
+]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "users_last_active_at", _users_last_active_at),
+    Migration(3, "history_indexes", _history_indexes),
+    Migration(4, "abuse_flags", _abuse_flags),
+    Migration(5, "idempotency_fingerprint", _idempotency_fingerprint),
+    Migration(6, "archive_partition_users", _archive_partition_users),
+]
+
+LATEST = MIGRATIONS[-1].version
+
+
+async def schema_version(engine: AsyncEngine) -> int:
+    """
+    Highest applied version, 0 for a database that predates migrations.
+    """
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(select(func.max(models.SchemaMigration.version)))
+            return result.scalar() or 0
+    except DBAPIError:
+        # No schema_migrations table yet
+        return 0
+
+
+async def upgrade(engine: AsyncEngine, target: Optional[int] = None) -> List[Migration]:
+    """
+    Apply pending steps up to `target` (default: latest), each in its own transaction.
+    """
+    target = LATEST if target is None else target
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version > target:
+            break
+        async with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+            has_table = await conn.run_sync(lambda c: inspect(c).has_table("schema_migrations"))
+            if has_table:
+                result = await conn.execute(
+                    select(models.SchemaMigration.version).where(models.SchemaMigration.version == migration.version)
+                )
+                if result.scalar() is not None:
+                    continue
+            await conn.run_sync(migration.upgrade)
+            await conn.execute(
+                models.SchemaMigration.__table__.insert().values(version=migration.version, name=migration.name)
+            )
+        logging.info(f"Applied migration {migration.version}: {migration.name}")
+        applied.append(migration)
+    return applied
+
+
+async def ensure_current(engine: AsyncEngine):
+    """
+    Worker boot check. Raises if the schema is behind and MIGRATE_ON_STARTUP is off.
+    """
+    version = await schema_version(engine)
+    if version == LATEST:
+        return
+    if version > LATEST:
+        # A newer deploy already migrated; steps are additive, so keep serving
+        logging.warning(f"Database schema is at version {version}, this code knows up to {LATEST}")
+        return
+    if not settings.MIGRATE_ON_STARTUP:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST}. Run `python -m app.migrations` first."
+        )
+    await upgrade(engine)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    parser.add_argument("--to", type=int, help="Target version (default: latest)")
+    args = parser.parse_args()
+
+    from app.database import engine
+
+    try:
+        if args.command == "status":
+            version = await schema_version(engine)
+            print(f"schema version {version}, latest {LATEST}")
+            for migration in MIGRATIONS:
+                print(f"  {'x' if migration.version <= version else ' '} {migration.version:>3} {migration.name}")
+            return
+        applied = await upgrade(engine, args.to)
+        print(f"applied {len(applied)} migration(s), schema version {await schema_version(engine)}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, Boolean, DateTime, CheckConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, Boolean, DateTime, CheckConstraint, UniqueConstraint, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -12,6 +12,7 @@ class User(Base):
     spins = Column(Integer, default=0)
     points = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_active_at = Column(DateTime, default=datetime.utcnow, index=True) # Flushed in batches by app.activity
 
     __table_args__ = (
         CheckConstraint("spins >= 0", name="ck_users_spins_nonneg"),
@@ -49,7 +50,7 @@ class Reward(Base):
     __tablename__ = "rewards"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True) # Per-user history
     prize_type = Column(String, nullable=False) # "points", "item", etc.
     prize_value = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -60,9 +61,133 @@ class TaskCompletion(Base):
     __tablename__ = "task_completions"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True) # Wheel unlock counts, per-user history
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True) # Revenue join in admin stats
     transaction_id = Column(String, unique=True, index=True) # From CPA postback
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="tasks_completed")
+
+class Wheel(Base):
+    __tablename__ = "wheels"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tier = Column(String, nullable=False, index=True) # "standard", "gold", ...
+    version = Column(Integer, nullable=False) # Versions are immutable; the highest one per tier is live
+    prizes = Column(JSON, nullable=False) # [{"prize_type", "prize_value", "probability", "angle"}, ...]
+    cost_per_spin = Column(Integer, default=1000) # Points per purchased spin
+    required_tasks = Column(Integer, default=0) # Completed tasks needed to unlock this tier
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("tier", "version", name="uq_wheels_tier_version"),
+    )
+
+class ConfigVersion(Base):
+    __tablename__ = "config_versions"
+
+    # One row per hot-reloadable config; workers poll this instead of the config tables themselves
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+
+    # Bot notifications written in the same transaction as the event that caused them
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, nullable=False) # Telegram chat id (the user's telegram_id for private chats)
+    text = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending") # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    available_at = Column(DateTime, default=datetime.utcnow) # Not sent before this (retry backoff)
+    claimed_at = Column(DateTime, nullable=True)
+    claim_token = Column(String, nullable=True, index=True) # Set by the dispatcher that holds the row
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_outbox_status_available_at", "status", "available_at"),
+    )
+
+class JobState(Base):
+    __tablename__ = "job_state"
+
+    # Progress of periodic jobs that scan incrementally (e.g. reminders)
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Stored responses of mutating requests, keyed by "<endpoint>:<telegram_id>:<Idempotency-Key>"
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=True) # idempotency.fingerprint() of the first request's parameters
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ArchivePartition(Base):
+    __tablename__ = "archive_partitions"
+
+    # Manifest of cold-storage files written by app.archive; one row per (table, day, chunk) file
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, nullable=False) # "rewards" or "task_completions"
+    path = Column(String, unique=True, nullable=False) # Relative to ARCHIVE_DIR
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    min_created_at = Column(DateTime, nullable=False)
+    max_created_at = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    payout_total = Column(Float, default=0.0) # Sum of task cpa_payout, keeps admin revenue stats whole
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_archive_partitions_table_max_created_at", "table_name", "max_created_at"),
+    )
+
+class ArchivePartitionUser(Base):
+    __tablename__ = "archive_partition_users"
+
+    # Which partitions hold a user's rows, so history reads open only those files
+    user_id = Column(Integer, primary_key=True)
+    partition_id = Column(Integer, ForeignKey("archive_partitions.id"), primary_key=True)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+class ArchivedTransaction(Base):
+    __tablename__ = "archived_transactions"
+
+    # Key-only index of archived task_completions.transaction_id so duplicate postbacks stay rejected
+    transaction_id = Column(String, primary_key=True)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+class ArchivedTaskCount(Base):
+    __tablename__ = "archived_task_counts"
+
+    # Completions per user moved to cold storage; added back when counting for wheel unlocks
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    # One row per applied app.migrations step; workers compare the max version on boot
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class AbuseFlag(Base):
+    __tablename__ = "abuse_flags"
+
+    # Keys app.abuse saw bursting past a rule's limit; written in batches, append-only
+    id = Column(Integer, primary_key=True)
+    rule = Column(String, nullable=False) # e.g. "spin_user", "postback_offer"
+    key = Column(String, nullable=False)  # Telegram id, IP or offer id, as a string
+    count = Column(Integer, nullable=False) # Events in the window when flagged
+    blocked = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_abuse_flags_rule_key", "rule", "key"),
+    )
@@ -0,0 +1,198 @@
+"""
+Outbox dispatcher for bot notifications.
+
+Rows in `outbox` are written by crud in the same transaction as the event they announce, so a
+postback never waits on the Telegram API. This worker claims pending rows in batches, sends them
+through the Bot API under a concurrency cap and a rate limit, and records the outcome.
+
+Runs inside the bot process (bot/main.py) or standalone:
+
+    python -m app.outbox
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import models, writer
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+MAX_BACKOFF_SECONDS = 3600
+
+PURGE_JOB_NAME = "outbox_purge"
+
+
+class RateLimiter:
+    """
+    Token bucket: at most `rate` acquisitions per second, with bursts up to `rate`.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def claim_batch(db: AsyncSession, limit: int, lease_seconds: float) -> List[models.OutboxMessage]:
+    """
+    Atomically take up to `limit` sendable rows for this dispatcher.
+    On PostgreSQL the inner SELECT is FOR UPDATE SKIP LOCKED so concurrent dispatchers never
+    block on each other; SQLite ignores the locking clause and serializes the UPDATE itself.
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    Outbox = models.OutboxMessage
+    claimable = or_(
+        and_(Outbox.status == STATUS_PENDING, Outbox.available_at <= now),
+        # Rows held past their lease belong to a dispatcher that died mid-send
+        and_(Outbox.status == STATUS_SENDING, Outbox.claimed_at < now - timedelta(seconds=lease_seconds)),
+    )
+    ids = (
+        select(Outbox.id)
+        .where(claimable)
+        .order_by(Outbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    await db.execute(
+        update(Outbox)
+        .where(Outbox.id.in_(ids))
+        .values(status=STATUS_SENDING, claimed_at=now, claim_token=token, attempts=Outbox.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    result = await db.execute(select(Outbox).where(Outbox.claim_token == token).order_by(Outbox.id))
+    return result.scalars().all()
+
+
+async def _send(bot: Bot, message: models.OutboxMessage, semaphore: asyncio.Semaphore, limiter: RateLimiter):
+    """
+    Returns (status, error, retry_delay_seconds).
+    """
+    async with semaphore:
+        await limiter.acquire()
+        try:
+            await bot.send_message(message.chat_id, message.text)
+            return STATUS_SENT, None, None
+        except TelegramRetryAfter as e:
+            return STATUS_PENDING, str(e), e.retry_after
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # User blocked the bot or chat is gone; retrying won't help
+            return STATUS_FAILED, str(e), None
+        except Exception as e:
+            return STATUS_PENDING, str(e), min(MAX_BACKOFF_SECONDS, 2 ** message.attempts)
+
+
+async def _record_results(db: AsyncSession, batch: List[models.OutboxMessage], results, max_attempts: int):
+    now = datetime.utcnow()
+    Outbox = models.OutboxMessage
+    sent_ids = []
+    for message, (status, error, delay) in zip(batch, results):
+        if status == STATUS_SENT:
+            sent_ids.append(message.id)
+            continue
+        if status == STATUS_PENDING and message.attempts >= max_attempts:
+            status = STATUS_FAILED
+        values = dict(status=status, last_error=(error or "")[:500], claim_token=None)
+        if status == STATUS_PENDING:
+            values["available_at"] = now + timedelta(seconds=delay or 0)
+        # Only touch rows we still hold; a reclaimed row belongs to someone else now
+        await db.execute(
+            update(Outbox)
+            .where(Outbox.id == message.id, Outbox.claim_token == message.claim_token)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    if sent_ids:
+        await db.execute(
+            update(Outbox)
+            .where(Outbox.id.in_(sent_ids), Outbox.claim_token == batch[0].claim_token)
+            .values(status=STATUS_SENT, claim_token=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+
+async def dispatch_once(bot: Bot, semaphore: asyncio.Semaphore, limiter: RateLimiter) -> int:
+    """
+    Claim, send and record one batch. Returns the number of messages claimed.
+    """
+    async with AsyncSessionLocal() as db:
+        batch = await claim_batch(db, settings.OUTBOX_BATCH_SIZE, settings.OUTBOX_LEASE_SECONDS)
+        if not batch:
+            return 0
+        results = await asyncio.gather(*[_send(bot, message, semaphore, limiter) for message in batch])
+        await _record_results(db, batch, results, settings.OUTBOX_MAX_ATTEMPTS)
+        return len(batch)
+
+
+async def run_dispatcher(bot: Bot, limiter: Optional[RateLimiter] = None):
+    semaphore = asyncio.Semaphore(settings.OUTBOX_CONCURRENCY)
+    limiter = limiter or RateLimiter(settings.OUTBOX_RATE_PER_SECOND)
+    while True:
+        try:
+            if await dispatch_once(bot, semaphore, limiter):
+                continue # Drain the backlog before sleeping
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception("Outbox dispatch failed")
+        await asyncio.sleep(settings.OUTBOX_POLL_SECONDS)
+
+
+async def _purge(db: AsyncSession, cutoff: datetime) -> int:
+    Outbox = models.OutboxMessage
+    # available_at is the last scheduled attempt, so (status, available_at) serves this delete
+    result = await db.execute(
+        delete(Outbox).where(Outbox.status.in_([STATUS_SENT, STATUS_FAILED]), Outbox.available_at < cutoff)
+    )
+    return result.rowcount
+
+
+async def purge_finished() -> int:
+    """
+    Delete sent/failed rows older than OUTBOX_RETENTION_DAYS; run periodically by the scheduler.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    async with AsyncSessionLocal() as db:
+        return await writer.run(db, _purge, cutoff)
+
+
+async def main():
+    bot = Bot(token=settings.BOT_TOKEN)
+    try:
+        await run_dispatcher(bot)
+    finally:
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
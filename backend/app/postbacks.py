@@ -0,0 +1,199 @@
+"""
+Postback gateway: per-network checks that run before a postback handler opens a DB session.
+
+Each CPA network endpoint is guarded by a route dependency that, in order:
+1. looks the client IP up in the network's allowlist (CIDRs compiled into a binary prefix trie,
+   so a lookup walks at most one prefix length of bits, however many ranges are listed)
+2. compares the shared token in constant time
+3. if the network signs its postbacks, checks the timestamp is within the skew window and the
+   HMAC-SHA256 signature over the sorted parameters, also in constant time
+
+Rejections answer 403 without touching the database and are counted per network and reason in
+app.shared (see GET /admin/postbacks/rejections).
+
+Networks are configured with POSTBACK_NETWORKS, a JSON object keyed by network name:
+
+    {"cpagrip": {"cidrs": ["203.0.113.0/24", "2001:db8::/32"],
+                 "hmac_secret": "...", "max_skew_seconds": 300}}
+
+Keys: cidrs (empty: any IP), token (default CPA_SECRET_TOKEN), hmac_secret (default: unsigned),
+signature_param ("signature"), timestamp_param ("ts"), max_skew_seconds (300). The signature is
+the hex HMAC of the urlencoded parameters sorted by name, without the signature itself.
+The client IP is the one uvicorn resolves: the socket peer, or the X-Forwarded-For client when the
+peer is listed in FORWARDED_ALLOW_IPS. Behind a load balancer that setting must cover it, or every
+postback appears to come from the balancer and no allowlist matches.
+"""
+import hashlib
+import hmac
+import ipaddress
+import json
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Union
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request
+
+from app import shared
+from app.config import settings
+
+# Endpoint networks; their parameter names come from the handlers in routers/tasks.py
+NETWORK_TOKEN_PARAMS = {
+    "postback": "token",
+    "cpagrip": "password",
+}
+
+REASONS = ("ip", "token", "timestamp", "signature")
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+class PrefixTrie:
+    """
+    Binary trie of CIDR prefixes. Nodes are [zero child, one child, terminal] lists.
+    """
+
+    def __init__(self, networks: Iterable[str] = ()):
+        self._roots = {4: [None, None, False], 6: [None, None, False]}
+        self.size = 0
+        for network in networks:
+            self.add(network)
+
+    def add(self, cidr: str):
+        network = ipaddress.ip_network(cidr, strict=False)
+        node = self._roots[network.version]
+        bits, width = int(network.network_address), network.max_prefixlen
+        for i in range(network.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        node[2] = True
+        self.size += 1
+
+    def __contains__(self, address: IPAddress) -> bool:
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        node = self._roots[address.version]
+        bits, width = int(address), address.max_prefixlen
+        for i in range(width):
+            if node[2]:
+                return True
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+
+@dataclass(frozen=True)
+class NetworkConfig:
+    name: str
+    token_param: str
+    token: bytes
+    allowlist: Optional[PrefixTrie] = None # None: any IP
+    hmac_secret: Optional[bytes] = None    # None: unsigned postbacks
+    signature_param: str = "signature"
+    timestamp_param: str = "ts"
+    max_skew_seconds: float = 300.0
+
+
+def compile_networks(raw: str) -> Dict[str, NetworkConfig]:
+    """
+    Build every endpoint network's config from POSTBACK_NETWORKS. Raises ValueError on bad config,
+    so a typo fails the boot instead of opening or closing the endpoint by surprise.
+    """
+    try:
+        overrides = json.loads(raw) if raw.strip() else {}
+    except json.JSONDecodeError as e:
+        raise ValueError(f"POSTBACK_NETWORKS is not valid JSON: {e}")
+    unknown = set(overrides) - set(NETWORK_TOKEN_PARAMS)
+    if unknown:
+        raise ValueError(f"POSTBACK_NETWORKS has unknown networks: {sorted(unknown)}")
+
+    networks = {}
+    for name, token_param in NETWORK_TOKEN_PARAMS.items():
+        options = overrides.get(name, {})
+        cidrs = options.get("cidrs") or []
+        secret = options.get("hmac_secret")
+        networks[name] = NetworkConfig(
+            name=name,
+            token_param=token_param,
+            token=str(options.get("token") or settings.CPA_SECRET_TOKEN).encode(),
+            allowlist=PrefixTrie(cidrs) if cidrs else None,
+            hmac_secret=secret.encode() if secret else None,
+            signature_param=options.get("signature_param", "signature"),
+            timestamp_param=options.get("timestamp_param", "ts"),
+            max_skew_seconds=float(options.get("max_skew_seconds", 300.0)),
+        )
+    return networks
+
+
+def sign(secret: bytes, params: Dict[str, str], signature_param: str = "signature") -> str:
+    message = urlencode(sorted((k, v) for k, v in params.items() if k != signature_param))
+    return hmac.new(secret, message.encode(), hashlib.sha256).hexdigest()
+
+
+def _client_ip(request: Request) -> Optional[IPAddress]:
+    if request.client is None:
+        return None
+    try:
+        return ipaddress.ip_address(request.client.host)
+    except ValueError:
+        return None
+
+
+def check(network: NetworkConfig, ip: Optional[IPAddress], params: Dict[str, str], now: float) -> Optional[str]:
+    """
+    Returns the rejection reason, or None if the postback may proceed.
+    """
+    if network.allowlist is not None and (ip is None or ip not in network.allowlist):
+        return "ip"
+    if not hmac.compare_digest(params.get(network.token_param, "").encode(), network.token):
+        return "token"
+    if network.hmac_secret is None:
+        return None
+    try:
+        timestamp = float(params.get(network.timestamp_param, ""))
+    except ValueError:
+        return "timestamp"
+    if not math.isfinite(timestamp) or abs(now - timestamp) > network.max_skew_seconds:
+        return "timestamp"
+    expected = sign(network.hmac_secret, params, network.signature_param)
+    if not hmac.compare_digest(params.get(network.signature_param, "").encode(), expected.encode()):
+        return "signature"
+    return None
+
+
+class PostbackGateway:
+    def __init__(self, networks: Dict[str, NetworkConfig]):
+        self.networks = networks
+
+    def guard(self, name: str):
+        """
+        Route dependency for a network's endpoint; list it in the route's `dependencies` so it
+        runs before the DB session dependency.
+        """
+        network = self.networks[name]
+
+        async def verify(request: Request):
+            params = dict(request.query_params)
+            if request.method == "POST":
+                # Starlette caches the parsed form, so the handler's Form fields reuse it
+                form = await request.form()
+                params.update((k, v) for k, v in form.items() if isinstance(v, str))
+            reason = check(network, _client_ip(request), params, time.time())
+            if reason is not None:
+                await shared.state.incr(f"postback_rejected:{name}:{reason}")
+                raise HTTPException(status_code=403, detail="Access Denied")
+
+        return verify
+
+    async def rejections(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {reason: await shared.state.get(f"postback_rejected:{name}:{reason}") for reason in REASONS}
+            for name in self.networks
+        }
+
+
+gateway = PostbackGateway(compile_networks(settings.POSTBACK_NETWORKS))
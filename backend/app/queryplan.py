@@ -0,0 +1,307 @@
+"""
+Query-plan regression check for the hot endpoints.
+
+Drives each hot endpoint once through the ASGI app, captures every SQL statement it issues, and
+asks the database for the plan of each one: EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL
+(with enable_seqscan off, so a sequential scan only shows up when no index can serve the query).
+A path fails when it exceeds its statement budget or when a statement scans a table the path is
+not allowed to scan. Aggregates over history tables may read through a covering index on SQLite,
+never the table itself.
+
+It writes fixture rows (users, a gated wheel tier), so it only ever runs against a scratch
+database. The test suite runs it on a temporary SQLite file:
+
+    python -m pytest tests/test_queryplan.py
+
+The CLI is for inspecting plans on a scratch database (ideally one filled by app.datagen) and
+exits non-zero on any violation:
+
+    DATABASE_URL=sqlite+aiosqlite:///./plans.db python -m app.queryplan -v
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import event, update
+from sqlalchemy.engine import Engine
+
+from app import crud, migrations, models, schemas, wheels
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+
+# Synthetic telegram ids for the fixtures; far from real and datagen ids
+PLAYER_ID = 2_100_000_001
+REFERRER_ID = 2_100_000_002
+ADMIN_ID = 2_100_000_003
+
+# Wheel tier that needs a completed task, so the spin path runs the unlock count
+GATED_TIER = "queryplan"
+
+PLANNED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# Tables bounded by configuration rather than traffic; scanning them is fine
+CONFIG_TABLES = frozenset({"tasks", "wheels", "config_versions", "archive_partitions", "job_state"})
+
+
+@dataclass(frozen=True)
+class HotPath:
+    name: str
+    method: str
+    path: str
+    budget: int # Max statements per request
+    query: Dict[str, str] = field(default_factory=dict)
+    form: Dict[str, str] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+    aggregates: FrozenSet[str] = frozenset() # Tables this path may read in full through a covering index
+
+
+def hot_paths() -> List[HotPath]:
+    # Fresh transaction ids every run so postbacks take the full insert path
+    run = uuid.uuid4().hex[:12]
+    return [
+        HotPath("spin", "POST", "/game/spin", 3, query={"telegram_id": str(PLAYER_ID)}),
+        HotPath(
+            "spin_idempotent", "POST", "/game/spin", 5,
+            query={"telegram_id": str(PLAYER_ID)}, headers={"Idempotency-Key": run},
+        ),
+        HotPath("buy_spins", "POST", "/game/buy_spins", 1, query={"telegram_id": str(PLAYER_ID), "amount": "1"}),
+        HotPath(
+            "postback", "GET", "/tasks/postback", 10,
+            query={"click_id": f"plan-{run}", "sub_id": str(PLAYER_ID), "payout": "1", "token": settings.CPA_SECRET_TOKEN},
+        ),
+        HotPath(
+            "cpagrip_postback", "POST", "/tasks/cpagrip_postback", 10,
+            form={"password": settings.CPA_SECRET_TOKEN, "payout": "1.5", "offer_id": run, "tracking_id": str(PLAYER_ID)},
+        ),
+        HotPath("spin_gated", "POST", "/game/spin", 6, query={"telegram_id": str(PLAYER_ID), "tier": GATED_TIER}),
+        HotPath("read_user", "GET", f"/users/{PLAYER_ID}", 1),
+        HotPath("read_tasks", "GET", "/tasks/", 1),
+        HotPath(
+            "stats", "GET", "/admin/stats", 5,
+            headers={"X-Telegram-ID": str(ADMIN_ID)},
+            aggregates=frozenset({"users", "task_completions"}),
+        ),
+    ]
+
+
+@dataclass
+class Finding:
+    statement: str
+    plan: List[str]
+    problems: List[str]
+
+
+@dataclass
+class PathReport:
+    name: str
+    status: int
+    statements: int
+    budget: int
+    findings: List[Finding]
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400 and self.statements <= self.budget and not any(f.problems for f in self.findings)
+
+
+class StatementRecorder:
+    """
+    Collects (statement, parameters) for everything sent to any engine while recording.
+    """
+
+    def __init__(self):
+        self.statements: List[Tuple[str, object]] = []
+        self.recording = False
+
+    def __enter__(self):
+        event.listen(Engine, "before_cursor_execute", self._capture)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, "before_cursor_execute", self._capture)
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.recording or not statement.lstrip().upper().startswith(PLANNED):
+            return
+        if executemany and parameters:
+            parameters = parameters[0]
+        self.statements.append((statement, parameters))
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def sqlite_problems(plan: List[str], aggregates: FrozenSet[str]) -> List[str]:
+    problems = []
+    for line in plan:
+        match = _SQLITE_SCAN.match(line.strip())
+        if not match:
+            continue
+        table, rest = match.group(1), match.group(2)
+        if table in CONFIG_TABLES:
+            continue
+        if table in aggregates and "COVERING INDEX" in rest:
+            continue
+        problems.append(f"full scan of {table}")
+    return problems
+
+
+def postgres_problems(plan: List[str], aggregates: FrozenSet[str]) -> List[str]:
+    problems = []
+    for line in plan:
+        match = _PG_SEQ_SCAN.search(line)
+        if match and match.group(1) not in CONFIG_TABLES:
+            problems.append(f"sequential scan of {match.group(1)}")
+    return problems
+
+
+async def explain(statement: str, parameters) -> List[str]:
+    async with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[-1] for row in result.all()]
+        if engine.dialect.name == "postgresql":
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+            plan = [row[0] for row in result.all()]
+            await conn.rollback()
+            return plan
+    raise RuntimeError(f"Unsupported dialect for plan checks: {engine.dialect.name}")
+
+
+async def _request(app, hot: HotPath) -> int:
+    """
+    Minimal in-process ASGI call; returns the response status.
+    """
+    headers = [(k.lower().encode(), v.encode()) for k, v in hot.headers.items()]
+    body = b""
+    if hot.form:
+        body = urlencode(hot.form).encode()
+        headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": hot.method,
+        "scheme": "http",
+        "path": hot.path,
+        "raw_path": hot.path.encode(),
+        "root_path": "",
+        "query_string": urlencode(hot.query).encode(),
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("queryplan", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _seed():
+    async with AsyncSessionLocal() as db:
+        referrer = await crud.get_user_by_telegram_id(db, REFERRER_ID)
+        if not referrer:
+            referrer = await crud.create_user(db, schemas.UserCreate(telegram_id=REFERRER_ID))
+        if not await crud.get_user_by_telegram_id(db, PLAYER_ID):
+            await crud.create_user(db, schemas.UserCreate(telegram_id=PLAYER_ID, referrer_id=referrer.id))
+        if not await crud.get_user_by_telegram_id(db, ADMIN_ID):
+            await crud.create_user(db, schemas.UserCreate(telegram_id=ADMIN_ID))
+        # Enough balance for every spin/buy the run makes
+        await db.execute(
+            update(models.User).where(models.User.telegram_id == PLAYER_ID).values(spins=100, points=1_000_000)
+        )
+        await db.commit()
+
+        if not wheels.registry.get(GATED_TIER):
+            prizes = [
+                schemas.WheelPrize(prize_type=t, prize_value=v, probability=p, angle=a)
+                for t, v, p, a in wheels.DEFAULT_PRIZES
+            ]
+            await crud.publish_wheel(db, GATED_TIER, schemas.WheelPublish(prizes=prizes, required_tasks=1))
+            await wheels.registry.refresh(db, force=True)
+
+
+async def check(paths: Optional[List[HotPath]] = None) -> List[PathReport]:
+    from app.main import app
+
+    # The stats path needs the fixture admin; restored afterwards
+    admin_ids, settings.ADMIN_IDS = settings.ADMIN_IDS, str(ADMIN_ID)
+    reports = []
+    await migrations.upgrade(engine)
+    try:
+        await _check_paths(app, paths, reports)
+    finally:
+        settings.ADMIN_IDS = admin_ids
+    return reports
+
+
+async def _check_paths(app, paths: Optional[List[HotPath]], reports: List[PathReport]):
+    async with app.router.lifespan_context(app):
+        await _seed()
+        with StatementRecorder() as recorder:
+            for hot in paths or hot_paths():
+                recorder.statements = []
+                recorder.recording = True
+                try:
+                    status = await _request(app, hot)
+                finally:
+                    recorder.recording = False
+
+                findings = []
+                for statement, parameters in recorder.statements:
+                    plan = await explain(statement, parameters)
+                    if engine.dialect.name == "sqlite":
+                        problems = sqlite_problems(plan, hot.aggregates)
+                    else:
+                        problems = postgres_problems(plan, hot.aggregates)
+                    findings.append(Finding(" ".join(statement.split()), plan, problems))
+                reports.append(PathReport(hot.name, status, len(recorder.statements), hot.budget, findings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check hot endpoint query plans and statement budgets")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every statement and its plan")
+    args = parser.parse_args()
+
+    reports = asyncio.run(check())
+    if args.json:
+        print(json.dumps([
+            dict(
+                name=r.name, ok=r.ok, status=r.status, statements=r.statements, budget=r.budget,
+                findings=[f.__dict__ for f in r.findings],
+            )
+            for r in reports
+        ], indent=2))
+    else:
+        for r in reports:
+            print(f"{'ok  ' if r.ok else 'FAIL'} {r.name:<18} status={r.status} statements={r.statements}/{r.budget}")
+            for f in r.findings:
+                if f.problems or args.verbose:
+                    print(f"       {f.statement}")
+                    for line in f.plan:
+                        print(f"         | {line}")
+                    for problem in f.problems:
+                        print(f"         ! {problem}")
+    sys.exit(0 if all(r.ok for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
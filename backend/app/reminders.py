@@ -0,0 +1,76 @@
+"""
+Daily reminder for users who stopped playing.
+
+Each run only looks at users whose last_active_at crossed the inactivity cutoff since the previous
+run: a keyset scan over the last_active_at index between the stored watermark and the new cutoff.
+Work is O(newly inactive users), and a user is reminded once per inactivity stretch. A crash
+mid-scan re-enqueues the unfinished range on the next run (at-least-once).
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import crud, models, writer
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+JOB_NAME = "inactive_reminders"
+REMINDER_TEXT = "🎡 Your wheel is waiting! Come back and spin."
+
+
+async def _enqueue(db: AsyncSession, telegram_ids: List[int]):
+    for telegram_id in telegram_ids:
+        crud.enqueue_message(db, telegram_id, REMINDER_TEXT)
+
+
+async def _save_watermark(db: AsyncSession, watermark: datetime):
+    state = await db.get(models.JobState, JOB_NAME)
+    if state is None:
+        db.add(models.JobState(name=JOB_NAME, watermark=watermark))
+    else:
+        state.watermark = watermark
+
+
+async def enqueue_inactive_reminders(now: Optional[datetime] = None) -> int:
+    """
+    Queue reminders for users who became inactive since the last run. Returns how many were queued.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.REMINDER_INACTIVE_HOURS)
+    User = models.User
+    total = 0
+
+    async with AsyncSessionLocal() as db:
+        state = await db.get(models.JobState, JOB_NAME)
+        if state and state.watermark:
+            start = state.watermark
+        else:
+            # First run: only the latest interval, not every dormant account in history
+            start = cutoff - timedelta(seconds=settings.REMINDER_SCAN_SECONDS)
+        if start >= cutoff:
+            return 0
+
+        last_ts, last_id = start, 0
+        while True:
+            result = await db.execute(
+                select(User.id, User.telegram_id, User.last_active_at)
+                .where(
+                    User.last_active_at >= last_ts,
+                    User.last_active_at < cutoff,
+                    or_(User.last_active_at > last_ts, User.id > last_id),
+                )
+                .order_by(User.last_active_at, User.id)
+                .limit(settings.REMINDER_CHUNK_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            await writer.run(db, _enqueue, [row.telegram_id for row in rows])
+            total += len(rows)
+            last_ts, last_id = rows[-1].last_active_at, rows[-1].id
+
+        await writer.run(db, _save_watermark, cutoff)
+    return total
@@ -0,0 +1,60 @@
+"""
+Response serialization fast paths.
+
+Routes with a response_model are already dumped straight to bytes by pydantic-core, as long as
+they keep FastAPI's default response class. What remains slow is handlers that return plain
+dicts (json.dumps) and payloads rebuilt on every request although they rarely change:
+
+- `JSONResponseClass` renders with orjson when FAST_JSON is on and orjson is installed; use it
+  as `response_class` on dict-returning routes only.
+- `CachedPayload` keeps a payload's serialized bytes for a short TTL.
+"""
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+JSONResponseClass = FastJSONResponse if settings.FAST_JSON and orjson is not None else JSONResponse
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class CachedPayload:
+    """
+    Serialized bytes of a slow-changing payload, rebuilt at most once per TTL per worker.
+    Writers broadcast through app.shared so every worker calls invalidate(); without a shared
+    backend, other workers catch up within the TTL.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._body: Optional[bytes] = None
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        self._body = None
+
+    async def response(self, build: Callable[[], Awaitable[bytes]]) -> Response:
+        now = time.monotonic()
+        if self._body is None or now >= self._expires_at:
+            self._body = await build()
+            self._expires_at = now + self.ttl_seconds
+        return Response(content=self._body, media_type="application/json")
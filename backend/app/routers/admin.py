@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
+from datetime import datetime
 
-from app import schemas, models, crud
-from app.database import get_db
+from app import schemas, models, crud, wheels, writer, events, shared
+from app.database import AsyncSessionLocal, get_db, get_read_db, mark_write
 from app.config import settings
+from app.responses import JSONResponseClass
 
 # For auth
 from app.routers.auth import get_current_user
@@ -27,9 +32,18 @@ async def get_current_admin(user: models.User = Depends(get_current_user)):
         )
     return user
 
+async def get_streaming_admin(x_telegram_id: Optional[str] = Header(None, alias="X-Telegram-ID")):
+    """
+    get_current_admin for streaming responses. A yield dependency's session is only closed once
+    the response has been sent, so the lookup uses its own short session instead of get_db.
+    """
+    async with AsyncSessionLocal() as db:
+        user = await get_current_user(x_telegram_id, db)
+    return await get_current_admin(user)
+
 @router.get("/stats", response_model=schemas.AdminStats)
 async def get_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
     # Total Users
@@ -39,12 +53,15 @@ async def get_stats(
     # Total Tasks Completed
     result_tasks = await db.execute(select(func.count(models.TaskCompletion.id)))
     total_tasks = result_tasks.scalar()
+    from app import archive
+    archived_tasks, archived_revenue = await archive.get_archived_totals(db, "task_completions")
+    total_tasks += archived_tasks
     
     # Estimate Revenue (Naive: count completions * task payout)
     # This requires joining TaskCompletion and Task
     revenue_query = select(func.sum(models.Task.cpa_payout)).join(models.TaskCompletion, models.Task.id == models.TaskCompletion.task_id)
     result_revenue = await db.execute(revenue_query)
-    estimated_revenue = result_revenue.scalar() or 0.0
+    estimated_revenue = (result_revenue.scalar() or 0.0) + archived_revenue
 
     # Total Spins Consumed (Needs a field or transaction log, currently we track current spins. 
     # Can approximation or adding a 'spins_used' field. For now, let's use a placeholder or derived if we had logs)
@@ -71,6 +88,8 @@ async def create_task(
     db.add(db_task)
     await db.commit()
     await db.refresh(db_task)
+    await shared.state.invalidate("tasks")
+    mark_write(admin.telegram_id)
     return db_task
 
 @router.post("/users/{user_id}/spins", response_model=schemas.UserResponse)
@@ -84,11 +103,160 @@ async def add_spins(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.spins += payload.amount
-    await db.commit()
-    await db.refresh(user)
+    user = await writer.run(db, crud.add_spins, user.id, payload.amount)
+    mark_write(user.telegram_id)
+    mark_write(admin.telegram_id)
+    events.hub.publish(user.telegram_id, "balance", {"spins": user.spins, "points": user.points})
     return user
 
+@router.get("/users/{user_id}/history", response_class=JSONResponseClass)
+async def user_history(
+    user_id: int,
+    table: str = Query("rewards", pattern="^(rewards|task_completions)$"),
+    before: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    A user's rewards or task completions, newest first. Reads through to cold storage
+    once the hot table runs out; archived rows are flagged with `archived: true`.
+    """
+    from app import archive
+    return await archive.get_history(db, table, user_id, limit, before)
+
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False,
+    admin: models.User = Depends(get_streaming_admin)
+):
+    """
+    Stream a table as CSV or NDJSON, optionally gzipped, filtered on created_at (since inclusive,
+    until exclusive). Rows are fetched in batches from a server-side cursor, so memory stays flat.
+    """
+    from app import export
+    if table not in export.TABLES:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    return StreamingResponse(
+        export.export(table, format, since, until, gzip),
+        media_type="application/gzip" if gzip else export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(table, format, gzip)}"'},
+    )
+
+@router.get("/postbacks/rejections", response_class=JSONResponseClass)
+async def postback_rejections(admin: models.User = Depends(get_current_admin)):
+    """
+    Postbacks turned away by the gateway, per network and reason, across all workers.
+    """
+    from app.postbacks import gateway
+    return await gateway.rejections()
+
+@router.get("/abuse/flags", response_class=JSONResponseClass)
+async def abuse_flags(
+    rule: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    Most recent keys flagged by the abuse detector, newest first.
+    """
+    query = select(models.AbuseFlag).order_by(models.AbuseFlag.created_at.desc()).limit(limit)
+    if rule:
+        query = query.where(models.AbuseFlag.rule == rule)
+    result = await db.execute(query)
+    return [
+        {"rule": f.rule, "key": f.key, "count": f.count, "blocked": f.blocked, "created_at": f.created_at.isoformat()}
+        for f in result.scalars().all()
+    ]
+
+@router.get("/wheels", response_model=List[schemas.WheelResponse])
+async def list_wheels(
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    # Latest published version of every tier
+    return await crud.get_latest_wheels(db)
+
+@router.get("/wheels/{tier}", response_model=List[schemas.WheelResponse])
+async def list_wheel_versions(
+    tier: str,
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    return await crud.get_wheel_versions(db, tier)
+
+@router.post("/wheels/{tier}", response_model=schemas.WheelResponse)
+async def publish_wheel(
+    tier: str,
+    payload: schemas.WheelPublish,
+    db: AsyncSession = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    Publish a new version of a tier's wheel. Other workers pick it up on their next version poll.
+    """
+    if not tier.isidentifier() or len(tier) > 32:
+        raise HTTPException(status_code=400, detail="Invalid tier name")
+    if tier == wheels.DEFAULT_TIER:
+        if not payload.is_active:
+            raise HTTPException(status_code=400, detail="The standard tier can't be deactivated")
+        if payload.cost_per_spin is None:
+            payload = payload.model_copy(update={"cost_per_spin": wheels.DEFAULT_COST_PER_SPIN})
+    elif payload.cost_per_spin is not None:
+        # buy_spins credits the one spin balance at the standard price
+        raise HTTPException(status_code=400, detail="cost_per_spin can only be set on the standard tier")
+
+    # Reject tables the spin path could not serve before they become live
+    try:
+        wheels.compile_wheel(
+            tier, 0,
+            [(p.prize_type, p.prize_value, p.probability, p.angle) for p in payload.prizes],
+            payload.cost_per_spin or wheels.DEFAULT_COST_PER_SPIN, payload.required_tasks
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        db_wheel = await crud.publish_wheel(db, tier, payload)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Concurrent publish, retry")
+
+    # This worker reloads right away; the others are woken by the broadcast instead of the next poll
+    await wheels.registry.refresh(db)
+    await shared.state.invalidate("wheels")
+    mark_write(admin.telegram_id)
+    return db_wheel
+
+@router.post("/wheels/{tier}/simulate", response_class=JSONResponseClass)
+async def simulate_wheel(
+    tier: str,
+    payload: schemas.WheelSimulationRequest,
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    Run the economy simulator against the live snapshot of a tier.
+    """
+    wheel = wheels.registry.get(tier)
+    if not wheel:
+        raise HTTPException(status_code=404, detail="Wheel not found")
+
+    # NumPy is only needed here; keep it off the import path of the rest of the API
+    from app import simulator
+
+    params = payload.model_dump()
+    seed = params.pop("seed")
+    model = simulator.PopulationModel(**params)
+    # CPU-bound, keep it off the event loop
+    report = await run_in_threadpool(
+        simulator.simulate, wheel, model, seed, max_spins=settings.SIMULATION_MAX_SPINS
+    )
+    return report.as_dict()
+
 @router.post("/broadcast")
 async def broadcast_message(
     payload: schemas.AdminBroadcast,
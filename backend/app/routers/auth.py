@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from app import database, crud, schemas
+from app import database, crud, schemas, activity
 from app.security import verify_telegram_init_data, TelegramInitDataError
 from typing import Optional
 
@@ -59,5 +59,7 @@ async def verify(init: schemas.AuthVerifyRequest, db: AsyncSession = Depends(dat
     if not db_user:
         # Register minimal fields; no referrer linkage here
         db_user = await crud.create_user(db, schemas.UserCreate(telegram_id=telegram_id, username=username))
+        database.mark_write(telegram_id)
 
+    activity.tracker.touch(telegram_id)
     return schemas.AuthVerifyResponse(user=db_user)
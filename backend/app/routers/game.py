@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import update
-from app import crud, schemas, database, models
+from app import crud, schemas, database, models, wheels, events, activity, idempotency, abuse
+from typing import Optional
 import secrets
 
 router = APIRouter(
@@ -9,88 +10,100 @@ router = APIRouter(
     tags=["game"]
 )
 
-# Prize Config (Should be in DB or Config for production)
-# Format: (Type, Value, Probability, Angle)
-PRIZES = [
-    ("spins", "1", 0.3, 0),
-    ("points", "100", 0.3, 45),
-    ("points", "500", 0.2, 90),
-    ("spins", "5", 0.1, 135),
-    ("item", "iphone", 0.001, 180), # Jackpot
-    ("points", "50", 0.099, 225),
-    ("spins", "2", 0.0, 270), # Placeholder
-    ("points", "1000", 0.0, 315) # Placeholder
-]
-
-COST_PER_SPIN = 1000
-
 @router.post("/spin", response_model=schemas.SpinResult)
-async def spin_wheel(telegram_id: int = Query(..., ge=1), db: AsyncSession = Depends(database.get_db)):
-    # Atomic decrement of spins (prevents race conditions)
+async def spin_wheel(
+    request: Request,
+    telegram_id: int = Query(..., ge=1),
+    tier: str = Query(wheels.DEFAULT_TIER, min_length=1, max_length=32),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=128),
+    db: AsyncSession = Depends(database.get_write_db)
+):
+    key = idempotency.scope("spin", telegram_id, idempotency_key) if idempotency_key else None
+    request_fingerprint = idempotency.fingerprint(tier=tier)
+    if key is not None:
+        # A retry gets its stored result without counting as a new attempt or re-reading the gate
+        stored = await idempotency.store.replay(db, key, request_fingerprint)
+        if stored is not None:
+            return stored
+
+    # Burst check runs in memory before the spin touches the DB
+    if not await abuse.detector.allow(("spin_user", telegram_id), ("spin_ip", abuse.client_ip(request))):
+        raise HTTPException(status_code=429, detail="Too many requests")
+
+    # Wheel config comes from the in-memory snapshot, never from the DB
+    wheel = wheels.registry.get(tier)
+    if not wheel:
+        raise HTTPException(status_code=404, detail="Wheel not found")
+
+    if wheel.required_tasks:
+        # Tiered wheels unlock after enough completed tasks
+        user_check = await crud.get_user_by_telegram_id(db, telegram_id)
+        if not user_check:
+            raise HTTPException(status_code=404, detail="User not found")
+        if await crud.count_completed_tasks(db, user_check.id) < wheel.required_tasks:
+            raise HTTPException(status_code=403, detail="Wheel locked")
+
+    result, replayed = await idempotency.store.execute(
+        db, key, _spin, telegram_id, wheel, request_fingerprint=request_fingerprint
+    )
+    if not replayed:
+        database.mark_write(telegram_id)
+        activity.tracker.touch(telegram_id)
+        events.hub.publish(telegram_id, "spin", result.model_dump())
+    return result
+
+async def _spin(db: AsyncSession, telegram_id: int, wheel: wheels.CompiledWheel) -> schemas.SpinResult:
+    # Atomic decrement of spins (prevents race conditions); RETURNING saves the re-read
     result = await db.execute(
         update(models.User)
         .where(models.User.telegram_id == telegram_id, models.User.spins > 0)
         .values(spins=models.User.spins - 1)
+        .returning(models.User.id, models.User.spins, models.User.points)
     )
-    if result.rowcount == 0:
+    row = result.first()
+    if row is None:
         # Determine if no user or no spins to provide accurate error
         user_check = await crud.get_user_by_telegram_id(db, telegram_id)
         if not user_check:
             raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=400, detail="No spins available")
 
-    # Secure RNG-based prize selection with integer weights to avoid float drift
-    PROB_SCALE = 1_000_000
-    weights = [int(p[2] * PROB_SCALE) for p in PRIZES]
-    total = sum(weights)
-    if total <= 0:
-        selected_index = len(PRIZES) - 1
-    else:
-        r = secrets.randbelow(total)
-        cum = 0
-        selected_index = len(PRIZES) - 1
-        for i, w in enumerate(weights):
-            cum += w
-            if r < cum:
-                selected_index = i
-                break
-
-    prize_type, prize_value, _, base_angle = PRIZES[selected_index]
+    prize = wheel.pick()
+    prize_type, prize_value, base_angle = prize.prize_type, prize.prize_value, prize.angle
     # 5..40 degrees offset to avoid wedge separators
     random_offset = 5 + secrets.randbelow(36)
     final_angle = (base_angle + random_offset) % 360
 
-    # Fetch user (post-decrement) and log reward
-    user = await crud.get_user_by_telegram_id(db, telegram_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    reward = models.Reward(user_id=user.id, prize_type=prize_type, prize_value=prize_value)
+    # Log reward (post-decrement balance already known)
+    user_id, spins, points = row
+    reward = models.Reward(user_id=user_id, prize_type=prize_type, prize_value=prize_value)
     db.add(reward)
 
     # Apply prize atomically
     if prize_type == "spins":
         add_amount = int(prize_value)
-        await db.execute(
+        result = await db.execute(
             update(models.User)
-            .where(models.User.id == user.id)
+            .where(models.User.id == user_id)
             .values(spins=models.User.spins + add_amount)
+            .returning(models.User.spins, models.User.points)
         )
+        spins, points = result.one()
     elif prize_type == "points":
         add_points = float(prize_value)
-        await db.execute(
+        result = await db.execute(
             update(models.User)
-            .where(models.User.id == user.id)
+            .where(models.User.id == user_id)
             .values(points=models.User.points + add_points)
+            .returning(models.User.spins, models.User.points)
         )
-
-    await db.commit()
-    await db.refresh(user)
+        spins, points = result.one()
 
     return schemas.SpinResult(
         prize_type=prize_type,
         prize_value=prize_value,
-        remaining_spins=user.spins,
+        remaining_spins=spins,
+        remaining_points=points,
         angle=final_angle
     )
 
@@ -98,35 +111,38 @@ async def spin_wheel(telegram_id: int = Query(..., ge=1), db: AsyncSession = Dep
 async def buy_spins(
     telegram_id: int = Query(..., ge=1),
     amount: int = Query(1, ge=1, le=1000),
-    db: AsyncSession = Depends(database.get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=128),
+    db: AsyncSession = Depends(database.get_write_db)
 ):
-    user = await crud.get_user_by_telegram_id(db, telegram_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    total_cost = COST_PER_SPIN * amount
-
-    # Atomic points deduction if sufficient
+    # Spins are a single balance, priced by the standard wheel
+    total_cost = wheels.registry.get().cost_per_spin * amount
+    key = idempotency.scope("buy_spins", telegram_id, idempotency_key) if idempotency_key else None
+    result, replayed = await idempotency.store.execute(
+        db, key, _buy_spins, telegram_id, amount, total_cost, request_fingerprint=idempotency.fingerprint(amount=amount)
+    )
+    if not replayed:
+        database.mark_write(telegram_id)
+        activity.tracker.touch(telegram_id)
+        events.hub.publish(telegram_id, "balance", {"spins": result.remaining_spins, "points": result.remaining_points})
+    return result
+
+async def _buy_spins(db: AsyncSession, telegram_id: int, amount: int, total_cost: int) -> schemas.PurchaseResult:
+    # Atomic points deduction and spin credit in one statement, if sufficient
     result = await db.execute(
         update(models.User)
-        .where(models.User.id == user.id, models.User.points >= total_cost)
-        .values(points=models.User.points - total_cost)
+        .where(models.User.telegram_id == telegram_id, models.User.points >= total_cost)
+        .values(points=models.User.points - total_cost, spins=models.User.spins + amount)
+        .returning(models.User.spins, models.User.points)
     )
-    if result.rowcount == 0:
+    row = result.first()
+    if row is None:
+        # Determine if no user or not enough points to provide accurate error
+        if not await crud.get_user_by_telegram_id(db, telegram_id):
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=400, detail="Insufficient points")
 
-    # Increment spins
-    await db.execute(
-        update(models.User)
-        .where(models.User.id == user.id)
-        .values(spins=models.User.spins + amount)
-    )
-
-    await db.commit()
-    await db.refresh(user)
-
     return schemas.PurchaseResult(
         spins_purchased=amount,
-        remaining_spins=user.spins,
-        remaining_points=user.points
+        remaining_spins=row.spins,
+        remaining_points=row.points
     )
@@ -2,16 +2,26 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select # Import select
 from typing import Optional
-from app import crud, schemas, database, models, config
-from pydantic import BaseModel, Field
+from app import crud, schemas, database, models, config, events, shared, abuse
+from app.postbacks import gateway
+from app.responses import CachedPayload, JSONResponseClass
+from pydantic import BaseModel, Field, TypeAdapter
 
 router = APIRouter(
     prefix="/tasks",
     tags=["tasks"]
 )
 
+_task_list = TypeAdapter(list[schemas.TaskResponse])
+# The task list only changes when an admin adds a task; serve it from serialized bytes
+tasks_cache = CachedPayload(config.settings.TASKS_CACHE_SECONDS)
+shared.state.on_invalidate("tasks", tasks_cache.invalidate)
+
 @router.get("/", response_model=list[schemas.TaskResponse])
-async def read_tasks(db: AsyncSession = Depends(database.get_db)):
+async def read_tasks(db: AsyncSession = Depends(database.get_read_db)):
+    return await tasks_cache.response(lambda: _serialize_tasks(db))
+
+async def _serialize_tasks(db: AsyncSession) -> bytes:
     # Fetch active tasks
     result = await db.execute(select(models.Task).where(models.Task.is_active == True))
     tasks = result.scalars().all()
@@ -25,21 +35,23 @@ async def read_tasks(db: AsyncSession = Depends(database.get_db)):
             seen.add(key)
             unique_tasks.append(t)
 
-    return unique_tasks
+    return _task_list.dump_json(_task_list.validate_python(unique_tasks, from_attributes=True))
 
 # Server-to-Server Postback endpoint (Legacy GET support)
-@router.get("/postback")
+# The gateway dependency (IP allowlist, token, signature) runs before the DB session is opened
+@router.get("/postback", response_class=JSONResponseClass, dependencies=[Depends(gateway.guard("postback"))])
 async def cpa_postback_get(
+    request: Request,
     click_id: str = Query(..., min_length=1, max_length=128), 
     sub_id: int = Query(..., ge=1), 
     payout: float = Query(..., ge=0, le=100000), 
     token: str = Query(..., min_length=8, max_length=128), 
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     # Legacy logic for original setup or networks that use GET
-    if token != config.settings.CPA_SECRET_TOKEN:
-        raise HTTPException(status_code=403, detail="Invalid Token")
-    
+    if not await abuse.detector.allow(("postback_user", sub_id), ("postback_ip", abuse.client_ip(request))):
+        raise HTTPException(status_code=429, detail="Too many requests")
+
     user = await crud.get_user_by_telegram_id(db, sub_id)
     if not user:
         return {"status": "error", "message": "User not found"}
@@ -48,9 +60,11 @@ async def cpa_postback_get(
     reward_spins = 3
     
     completion = await crud.complete_task(db, user.id, task_id, click_id, reward_spins)
+    database.mark_write(sub_id)
     
     if completion:
-        return {"status": "ok", "new_spins": user.spins}
+        events.hub.publish(sub_id, "task_completed", {"reward_spins": reward_spins, "spins": completion.user.spins})
+        return {"status": "ok", "new_spins": completion.user.spins}
     else:
         return {"status": "duplicate"}
 
@@ -66,31 +80,25 @@ class CPAGripPayload(BaseModel):
 # CPAGrip POST Endpoint (Form Data or JSON? Docs say [POST] variables usually Form Data)
 from fastapi import Form
 
-@router.post("/cpagrip_postback")
+@router.post("/cpagrip_postback", response_class=JSONResponseClass, dependencies=[Depends(gateway.guard("cpagrip"))])
 async def cpagrip_postback(
+    request: Request,
     password: str = Form(...),
     payout: float = Form(...),
     offer_id: str = Form(...),
     tracking_id: str = Form(...),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     """
     Dedicated endpoint for CPAGrip Global Postback
     """
-    # Security Check
-    if password != config.settings.CPA_SECRET_TOKEN:
-        # Do not leak secrets in logs
-        raise HTTPException(status_code=403, detail="Access Denied")  # Matches PHP example "Access Denied"
-
+    # Security Check (IP, password, signature) is done by the gateway dependency.
+    # Validate everything else before the first query, so malformed postbacks never cost a read.
     try:
         telegram_id = int(tracking_id)
     except ValueError:
         return {"status": "error", "message": "Invalid Tracking ID"}
 
-    user = await crud.get_user_by_telegram_id(db, telegram_id)
-    if not user:
-        return {"status": "error", "message": "User not found"}
-
     # Validate payout and compute reward spins safely
     if payout < 0:
         return {"status": "error", "message": "Invalid payout"}
@@ -104,14 +112,26 @@ async def cpagrip_postback(
     # Basic validation on offer_id length
     if len(offer_id) > 128:
         return {"status": "error", "message": "Invalid offer ID"}
+
+    if not await abuse.detector.allow(
+        ("postback_user", telegram_id), ("postback_offer", offer_id), ("postback_ip", abuse.client_ip(request))
+    ):
+        raise HTTPException(status_code=429, detail="Too many requests")
+
+    user = await crud.get_user_by_telegram_id(db, telegram_id)
+    if not user:
+        return {"status": "error", "message": "User not found"}
+
     transaction_key = f"cpagrip_{offer_id}_{telegram_id}"
     
     # Use a generic "CPAGrip Task" ID from DB or just 0
     task_id = 999 
 
     completion = await crud.complete_task(db, user.id, task_id, transaction_key, reward_spins)
+    database.mark_write(telegram_id)
     
     if completion:
+        events.hub.publish(telegram_id, "task_completed", {"reward_spins": reward_spins, "spins": completion.user.spins})
         return {"status": "ok", "message": "Postback processed"}
     else:
         # Already completed this offer
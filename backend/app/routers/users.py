@@ -1,22 +1,71 @@
+import asyncio
+import time
 from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app import crud, schemas, database
+from app import crud, schemas, database, events, activity, abuse
+from app.config import settings
 
 router = APIRouter(
     prefix="/users",
     tags=["users"]
 )
 
+# Client reconnect delay after a stream ends at its max lifetime
+EVENTS_RETRY_MS = 1000
+
 @router.post("/", response_model=schemas.UserResponse)
-async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_write_db)):
     db_user = await crud.get_user_by_telegram_id(db, telegram_id=user.telegram_id)
     if db_user:
         return db_user
-    return await crud.create_user(db=db, user=user)
+    if user.referrer_id and not await abuse.detector.allow(("referral", user.referrer_id)):
+        # Referrer is soft-blocked for a sign-up burst: create the user, credit no one
+        user = user.model_copy(update={"referrer_id": None})
+    db_user = await crud.create_user(db=db, user=user)
+    database.mark_write(user.telegram_id)
+    return db_user
 
 @router.get("/{telegram_id}", response_model=schemas.UserResponse)
-async def read_user(telegram_id: int = Path(..., ge=1), db: AsyncSession = Depends(database.get_db)):
+async def read_user(telegram_id: int = Path(..., ge=1), db: AsyncSession = Depends(database.get_read_db)):
     db_user = await crud.get_user_by_telegram_id(db, telegram_id=telegram_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    # Opening the Mini App counts as activity
+    activity.tracker.touch(telegram_id)
     return db_user
+
+@router.get("/{telegram_id}/events")
+async def user_events(telegram_id: int = Path(..., ge=1)):
+    """
+    Server-Sent Events stream of balance changes, spin results and task completions.
+    Starts with the current balance, so clients need no separate GET /users/{telegram_id}.
+    Each stream ends after EVENTS_MAX_STREAM_SECONDS and EventSource reconnects on its own, so
+    open streams never hold up a worker's graceful shutdown for longer than that.
+    """
+    # Short-lived session: the stream itself must not hold a DB connection.
+    # Same primary/replica choice as get_read_db, so a reconnect right after a spin isn't stale.
+    session_factory = await database.read_session_factory(telegram_id)
+    async with session_factory() as db:
+        db_user = await crud.get_user_by_telegram_id(db, telegram_id=telegram_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    snapshot = events.format_sse("balance", {"spins": db_user.spins, "points": db_user.points})
+    activity.tracker.touch(telegram_id)
+
+    async def stream():
+        deadline = time.monotonic() + settings.EVENTS_MAX_STREAM_SECONDS
+        async with events.hub.subscription(str(telegram_id)) as queue:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            yield snapshot
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=min(settings.EVENTS_KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
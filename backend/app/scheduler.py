@@ -0,0 +1,33 @@
+"""
+Minimal periodic job scheduler for single-instance background processes (run by the bot process).
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+Job = Callable[[], Awaitable[object]]
+
+
+class Scheduler:
+    def __init__(self):
+        self._jobs: List[Tuple[str, float, Job]] = []
+
+    def add_job(self, name: str, interval: float, job: Job) -> None:
+        self._jobs.append((name, interval, job))
+
+    async def _loop(self, name: str, interval: float, job: Job):
+        while True:
+            started = time.monotonic()
+            try:
+                result = await job()
+                logging.info(f"Job {name} finished in {time.monotonic() - started:.2f}s: {result}")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception(f"Job {name} failed")
+            # Fixed rate: a slow run shortens the following sleep
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def run(self):
+        await asyncio.gather(*(self._loop(name, interval, job) for name, interval, job in self._jobs))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, conint, confloat, constr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # User
@@ -50,8 +50,42 @@ class SpinResult(BaseModel):
     prize_type: str
     prize_value: str
     remaining_spins: int
+    remaining_points: float
     angle: int # For frontend animation
 
+# Wheel
+class WheelPrize(BaseModel):
+    prize_type: constr(min_length=1, max_length=32) # "spins", "points", "item"
+    prize_value: constr(min_length=1, max_length=64)
+    probability: confloat(ge=0, le=1)
+    angle: conint(ge=0, lt=360)
+
+class WheelPublish(BaseModel):
+    prizes: List[WheelPrize]
+    cost_per_spin: Optional[conint(ge=1)] = None # Standard tier only (default 1000): spins are one balance
+    required_tasks: conint(ge=0) = 0
+    is_active: bool = True
+
+class WheelResponse(WheelPublish):
+    id: int
+    tier: str
+    version: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class WheelSimulationRequest(BaseModel):
+    users: conint(ge=1, le=5_000_000) = 100_000
+    starting_spins: conint(ge=0, le=1000) = 5
+    tasks_per_user: confloat(ge=0, le=100) = 1.0
+    mean_payout: confloat(ge=0, le=1000) = 0.5
+    referral_rate: confloat(ge=0, le=1) = 0.0
+    buy_rate: confloat(ge=0, le=1) = 1.0
+    point_value: confloat(ge=0) = 0.0
+    item_values: Dict[str, float] = {}
+    seed: Optional[int] = None
+
 # Purchase Result
 class PurchaseResult(BaseModel):
     spins_purchased: int
@@ -0,0 +1,123 @@
+"""
+Serialization benchmark: CPU per request for the old and fast response paths.
+
+Each case runs both variants in-process and reports process CPU time per operation (which
+includes aiosqlite's worker thread), so the numbers are the CPU a worker saves per request.
+The balance read-back case uses an in-memory SQLite database.
+
+    python -m app.serialbench --iterations 20000
+"""
+import argparse
+import asyncio
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import JSONResponse
+
+from app import models, responses, schemas
+from app.database import Base
+
+
+def _cpu_per_op(fn, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+async def _cpu_per_op_async(fn, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        await fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def _report(name: str, before: float, after: float):
+    saved = before - after
+    print(f"{name:<28} {before:9.1f} us -> {after:9.1f} us   saves {saved:8.1f} us ({saved / before:6.1%})")
+
+
+def bench_task_list(iterations: int, tasks: int = 20):
+    rows = [
+        models.Task(id=i, name=f"Offer {i}", description="Install and open", cpa_network_id=f"net_{i}",
+                    reward_spins=2, cpa_payout=1.0, is_active=True)
+        for i in range(tasks)
+    ]
+    adapter = TypeAdapter(list[schemas.TaskResponse])
+    cache = responses.CachedPayload(ttl_seconds=3600)
+
+    async def cached():
+        return await cache.response(_build)
+
+    async def _build():
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+    before = _cpu_per_op(lambda: adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), iterations)
+    loop = asyncio.new_event_loop()
+    try:
+        after = loop.run_until_complete(_cpu_per_op_async(cached, iterations))
+    finally:
+        loop.close()
+    _report(f"GET /tasks/ body ({tasks} tasks)", before, after)
+
+
+def bench_dict_payload(iterations: int):
+    if responses.orjson is None:
+        print("dict payload: orjson not installed, skipped")
+        return
+    payload = {"status": "ok", "new_spins": 17, "items": [{"id": i, "archived": False} for i in range(20)]}
+    stdlib = JSONResponse(payload)
+    fast = responses.FastJSONResponse(payload)
+    before = _cpu_per_op(lambda: stdlib.render(payload), iterations)
+    after = _cpu_per_op(lambda: fast.render(payload), iterations)
+    _report("dict payload render", before, after)
+
+
+async def bench_balance_readback(iterations: int):
+    # Spin/buy balance: UPDATE + re-SELECT + refresh vs UPDATE ... RETURNING
+    db_engine = create_async_engine("sqlite+aiosqlite://")
+    async with db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    User = models.User
+    async with Session() as db:
+        db.add(User(telegram_id=42, spins=iterations * 4, points=0.0))
+        await db.commit()
+
+        async def refreshed():
+            await db.execute(update(User).where(User.telegram_id == 42, User.spins > 0).values(spins=User.spins - 1))
+            user = (await db.execute(select(User).where(User.telegram_id == 42))).scalars().first()
+            await db.refresh(user)
+            return user.spins, user.points
+
+        async def returning():
+            result = await db.execute(
+                update(User).where(User.telegram_id == 42, User.spins > 0)
+                .values(spins=User.spins - 1).returning(User.spins, User.points)
+            )
+            return result.one()
+
+        before = await _cpu_per_op_async(refreshed, iterations)
+        after = await _cpu_per_op_async(returning, iterations)
+        await db.rollback()
+    await db_engine.dispose()
+    _report("spin balance read-back", before, after)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU per request, old vs fast serialization paths")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'case':<28} {'before':>12}    {'after':>12}")
+    bench_task_list(args.iterations)
+    bench_dict_payload(args.iterations)
+    asyncio.run(bench_balance_readback(max(1, args.iterations // 10)))
+
+
+if __name__ == "__main__":
+    main()
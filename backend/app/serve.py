@@ -0,0 +1,110 @@
+"""
+Production launcher: one uvicorn worker per core, with DB pools sized to fit the server.
+
+    python -m app.serve --port 8000
+    python -m app.serve --workers 4 --dry-run   # print the plan only
+
+Workers default to WEB_CONCURRENCY or the CPUs this process may use. With DB_MAX_CONNECTIONS set,
+the connections left after DB_RESERVED_CONNECTIONS are split evenly over every worker's pools
+(two per worker when DATABASE_READ_URL is set), and passed to the workers as DB_POOL_SIZE /
+DB_MAX_OVERFLOW; the worker count is capped so each pool gets at least one connection.
+
+More than one worker needs REDIS_URL, since idempotency, SSE events, cache invalidation and
+read-your-writes pins are shared through Redis (app.shared); without it the launcher falls back
+to one worker, and an explicit --workers above 1 is an error. SQLite also gets one worker unless
+--workers is given explicitly: its writer actor serializes writes within a process only.
+Run `python -m app.migrations` before starting; workers refuse to boot on an old schema.
+Behind a load balancer set FORWARDED_ALLOW_IPS so request.client is the real client, not the proxy.
+"""
+import argparse
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class Plan:
+    workers: int
+    pool_size: int
+    max_overflow: int
+    notes: tuple = ()
+
+
+def usable_cpus() -> int:
+    try:
+        # Respects taskset/cgroup cpusets, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan(requested: Optional[int] = None) -> Plan:
+    notes = []
+    workers = requested or settings.WEB_CONCURRENCY or usable_cpus()
+    if make_url(settings.DATABASE_URL).get_backend_name() == "sqlite" and not requested and workers > 1:
+        notes.append("SQLite: one worker (pass --workers to override)")
+        workers = 1
+    if not settings.REDIS_URL and workers > 1:
+        if requested:
+            raise ValueError("More than one worker needs REDIS_URL for shared state; set it or use --workers 1")
+        notes.append("no REDIS_URL: one worker, in-process state can't be shared")
+        workers = 1
+
+    pool_size, max_overflow = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    if settings.DB_MAX_CONNECTIONS:
+        pools_per_worker = 2 if settings.DATABASE_READ_URL else 1
+        budget = settings.DB_MAX_CONNECTIONS - settings.DB_RESERVED_CONNECTIONS
+        if budget < pools_per_worker:
+            raise ValueError(
+                f"DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS} leaves no room after "
+                f"DB_RESERVED_CONNECTIONS={settings.DB_RESERVED_CONNECTIONS}"
+            )
+        if workers * pools_per_worker > budget:
+            notes.append(f"capped at {budget // pools_per_worker} workers by the connection budget")
+            workers = budget // pools_per_worker
+        # Hard cap: no overflow, so the total can never exceed the budget
+        pool_size, max_overflow = budget // (workers * pools_per_worker), 0
+    return Plan(workers, pool_size, max_overflow, tuple(notes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with one worker per core")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, help="Worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the worker/pool plan and exit")
+    args = parser.parse_args()
+
+    try:
+        p = plan(args.workers)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"workers={p.workers} pool_size={p.pool_size} max_overflow={p.max_overflow}")
+    for note in p.notes:
+        print(f"  {note}")
+    if args.dry_run:
+        return
+
+    # Workers are fresh processes that read their settings from the environment
+    os.environ["DB_POOL_SIZE"] = str(p.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(p.max_overflow)
+
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app", host=args.host, port=args.port, workers=p.workers,
+        proxy_headers=True, forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS,
+        # Don't wait on long-lived SSE streams forever; shutdown flushes run after this
+        timeout_graceful_shutdown=int(settings.GRACEFUL_SHUTDOWN_SECONDS),
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
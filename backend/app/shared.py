@@ -0,0 +1,237 @@
+"""
+State shared by all workers of a multi-process deployment (app.serve).
+
+Every uvicorn worker is its own process, so module-level state (caches, config snapshots,
+counters, read-your-writes pins) would otherwise drift apart between workers. This module is
+the one place they agree on:
+
+- counters: `incr(key, amount, ttl)` returns the deployment-wide value, optionally in a fixed
+  window that expires `ttl` seconds after its first increment
+- flags: `set_flag(key, ttl)` / `has_flag(key)` for short-lived markers
+- invalidation broadcasts: `invalidate(name)` runs the handlers every worker registered with
+  `on_invalidate(name, handler)`
+
+With REDIS_URL set (requires the `redis` package) this is backed by Redis. Otherwise, or if Redis
+is unreachable, MemoryBackend keeps the same semantics within one process: correct for a single
+worker and the stand-in used by tests and CLIs.
+
+Its Redis client (`state.redis`, None without Redis) is the worker's only one: app.events and
+app.idempotency use it too, so each worker opens one connection pool.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+KEY_PREFIX = "shared:"
+CHANNEL = "shared:invalidate"
+
+
+class MemoryBackend:
+    """
+    In-process backend. Expired entries are dropped lazily and whenever the map is full.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._values: Dict[str, Tuple[int, float]] = {} # key -> (value, monotonic expiry or inf)
+
+    def _live(self, key: str, now: float) -> Optional[int]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry[0]
+
+    def _bound(self, now: float):
+        if len(self._values) < self.max_keys:
+            return
+        for key in [k for k, (_, expires_at) in self._values.items() if expires_at <= now] or list(self._values):
+            del self._values[key]
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.monotonic()
+        current = self._live(key, now)
+        if current is None:
+            self._bound(now)
+            self._values[key] = (amount, now + ttl if ttl else float("inf"))
+            return amount
+        self._values[key] = (current + amount, self._values[key][1])
+        return current + amount
+
+    async def get(self, key: str) -> int:
+        return self._live(key, time.monotonic()) or 0
+
+    async def set_flag(self, key: str, ttl: float):
+        now = time.monotonic()
+        self._bound(now)
+        self._values[key] = (1, now + ttl)
+
+    async def has_flag(self, key: str) -> bool:
+        return self._live(key, time.monotonic()) is not None
+
+    async def publish(self, message: str):
+        # Single process: the local handlers already ran in SharedState.invalidate
+        pass
+
+    async def close(self):
+        pass
+
+
+class RedisBackend:
+    def __init__(self, client):
+        self._redis = client
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        key = KEY_PREFIX + key
+        if not ttl:
+            return await self._redis.incrby(key, amount)
+        # SET NX starts the window with its expiry; INCRBY keeps that expiry
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, 0, px=int(ttl * 1000), nx=True)
+            pipe.incrby(key, amount)
+            _, value = await pipe.execute()
+        return value
+
+    async def get(self, key: str) -> int:
+        return int(await self._redis.get(KEY_PREFIX + key) or 0)
+
+    async def set_flag(self, key: str, ttl: float):
+        await self._redis.set(KEY_PREFIX + key, 1, px=int(ttl * 1000))
+
+    async def has_flag(self, key: str) -> bool:
+        return bool(await self._redis.exists(KEY_PREFIX + key))
+
+    async def publish(self, message: str):
+        await self._redis.publish(CHANNEL, message)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+class SharedState:
+    def __init__(self):
+        self.local = MemoryBackend()
+        self._backend = self.local
+        self.redis = None
+        self._handlers: Dict[str, List[Callable[[], None]]] = defaultdict(list)
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+        # Tags this worker's broadcasts so it doesn't run its handlers twice
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    @property
+    def is_shared(self) -> bool:
+        return self._backend is not self.local
+
+    async def start(self, redis_url: Optional[str]):
+        if not redis_url:
+            return
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            logging.warning("REDIS_URL is set but the redis package is missing; shared state stays in-process")
+            return
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self._backend = RedisBackend(self.redis)
+        self._listener = asyncio.create_task(self._relay(self.redis))
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        await self._backend.close()
+        self._backend = self.local
+        self.redis = None
+
+    async def _call(self, name: str, *args):
+        try:
+            return await getattr(self._backend, name)(*args)
+        except Exception as e:
+            if not self.is_shared:
+                raise
+            # Degrade to this worker's view rather than fail the request
+            logging.warning(f"Shared state {name} failed, using local state: {e}")
+            return await getattr(self.local, name)(*args)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await self._call("incr", key, amount, ttl)
+
+    async def get(self, key: str) -> int:
+        return await self._call("get", key)
+
+    async def set_flag(self, key: str, ttl: float):
+        await self._call("set_flag", key, ttl)
+
+    async def has_flag(self, key: str) -> bool:
+        return await self._call("has_flag", key)
+
+    def set_flag_nowait(self, key: str, ttl: float) -> None:
+        """
+        Fire-and-forget set_flag for sync callers. Only reaches the shared backend: callers keep
+        their own in-process copy, so there is nothing to do for a single worker.
+        """
+        if self.is_shared:
+            self._spawn(self._call("set_flag", key, ttl))
+
+    def on_invalidate(self, name: str, handler: Callable[[], None]):
+        """
+        Register a sync handler run in every worker when `name` is invalidated anywhere.
+        """
+        self._handlers[name].append(handler)
+
+    async def invalidate(self, name: str):
+        self._run_handlers(name)
+        if self.is_shared:
+            try:
+                await self._backend.publish(f"{self.worker_id} {name}")
+            except Exception as e:
+                # Other workers fall back to their own TTLs/polls
+                logging.warning(f"Invalidation broadcast of {name} failed: {e}")
+
+    def _run_handlers(self, name: str):
+        for handler in self._handlers.get(name, ()):
+            try:
+                handler()
+            except Exception:
+                logging.exception(f"Invalidation handler for {name} failed")
+
+    def _spawn(self, coro):
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            # No loop (sync CLI code): nothing to share with
+            coro.close()
+            return
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _relay(self, client):
+        while True:
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    origin, _, name = message["data"].partition(" ")
+                    if origin != self.worker_id:
+                        self._run_handlers(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Shared state relay lost its Redis subscription; reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+state = SharedState()
@@ -0,0 +1,331 @@
+"""
+Wheel economy simulator.
+
+Monte Carlo over a compiled wheel and a population model. Spins are drawn in batched NumPy
+arrays, so the hundreds of millions of spins needed to pin down a 0.1% jackpot take seconds
+instead of hours.
+
+    python -m app.simulator --users 1000000 --tier standard
+    python -m app.simulator --users 1000000 --config gold.json --item-value iphone=1000
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional
+
+import numpy as np
+
+from app import wheels
+from app.database import AsyncSessionLocal
+
+# Mirrors crud.complete_task and routers/tasks.py
+REFERRAL_BONUS_SPINS = 3
+MAX_REWARD_SPINS = 100
+
+# z for a two-sided 95% interval
+Z_95 = 1.959963984540054
+
+
+@dataclass
+class PopulationModel:
+    users: int = 100_000
+    starting_spins: int = 5 # Free spins on signup
+    tasks_per_user: float = 1.0 # Mean CPA completions per user (Poisson)
+    mean_payout: float = 0.5 # Mean CPA payout in USD (exponential)
+    referral_rate: float = 0.0 # Fraction of users who joined through a referral link
+    buy_rate: float = 1.0 # Fraction of users who convert points to spins whenever they can
+    point_value: float = 0.0 # USD liability per outstanding point
+    item_values: Dict[str, float] = field(default_factory=dict) # USD cost per item prize
+
+
+@dataclass
+class SimulationReport:
+    tier: str
+    version: int
+    users: int
+    total_spins: int
+    spins_starting: int
+    spins_from_tasks: int
+    spins_from_referrals: int
+    spins_from_prizes: int
+    spins_bought: int
+    points_awarded: float
+    points_spent: float
+    points_outstanding: float
+    expected_points_per_spin: float
+    expected_spins_per_spin: float
+    prize_counts: Dict[str, int]
+    jackpots: int
+    jackpot_rate: float
+    jackpot_rate_ci95: tuple
+    cpa_revenue: float
+    item_liability: float
+    points_liability: float
+    total_liability: float
+    margin: float
+    truncated: bool # True if the buy/spin loop hit max_rounds (points per spin >= cost) or max_spins
+    elapsed_seconds: float
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z_95) -> tuple:
+    """
+    Wilson score interval; stays sane for rare events where the normal approximation does not.
+    """
+    if trials <= 0:
+        return (0.0, 0.0)
+    p = successes / trials
+    denom = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denom
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return (max(0.0, center - half), min(1.0, center + half))
+
+
+def _cpa_rewards(rng, n: int, model: PopulationModel):
+    """
+    Draw per-user CPA completions and their spin rewards.
+    Returns (reward spins per user, tasks per user, total payout).
+    """
+    tasks = rng.poisson(model.tasks_per_user, size=n)
+    total_tasks = int(tasks.sum())
+    if total_tasks == 0:
+        return np.zeros(n, dtype=np.int64), tasks, 0.0
+    payouts = rng.exponential(model.mean_payout, size=total_tasks)
+    # 1 Spin per $0.50 payout (min 1, max 100), as in cpagrip_postback
+    rewards = np.clip((payouts * 2).astype(np.int64), 1, MAX_REWARD_SPINS)
+    owner = np.repeat(np.arange(n), tasks)
+    spins = np.bincount(owner, weights=rewards, minlength=n).astype(np.int64)
+    return spins, tasks, float(payouts.sum())
+
+
+def _spin_batches(users: np.ndarray, counts: np.ndarray, limit: int):
+    """
+    Split users' spin counts into (users, counts) slices of at most `limit` spins each, cutting on
+    the cumulative count; a user with more than `limit` spins is spread over several slices.
+    """
+    ends = np.cumsum(counts)
+    begins = ends - counts
+    total = int(ends[-1]) if ends.size else 0
+    for start in range(0, total, limit):
+        stop = min(start + limit, total)
+        lo = int(np.searchsorted(ends, start, side="right"))
+        hi = int(np.searchsorted(begins, stop, side="left"))
+        yield users[lo:hi], np.minimum(ends[lo:hi], stop) - np.maximum(begins[lo:hi], start)
+
+
+def simulate(
+    wheel: wheels.CompiledWheel,
+    model: PopulationModel,
+    seed: Optional[int] = None,
+    chunk_size: int = 200_000,
+    max_rounds: int = 10_000,
+    spin_batch: int = 2_000_000,
+    max_spins: Optional[int] = None,
+) -> SimulationReport:
+    """
+    Play every user's spins to exhaustion, including spins won from the wheel and spins bought
+    with points, then report the economy.
+
+    Users are processed `chunk_size` at a time and their spins drawn at most `spin_batch` at a
+    time, so memory stays bounded however many spins each user has. With `max_spins` the run
+    stops (truncated) before drawing more than that many spins in total.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    cumulative = np.asarray(wheel.cumulative, dtype=np.int64)
+    total_weight = int(wheel.total)
+    spin_values = np.array(
+        [int(p.prize_value) if p.prize_type == "spins" else 0 for p in wheel.prizes], dtype=np.int64
+    )
+    point_values = np.array(
+        [float(p.prize_value) if p.prize_type == "points" else 0.0 for p in wheel.prizes], dtype=np.float64
+    )
+    is_item = np.array([p.prize_type == "item" for p in wheel.prizes])
+    cost = wheel.cost_per_spin
+
+    prize_counts = np.zeros(len(wheel.prizes), dtype=np.int64)
+    totals = dict(
+        spins=0, starting=0, tasks=0, referrals=0, prizes=0, bought=0,
+        points_awarded=0.0, points_spent=0.0, points_outstanding=0.0, revenue=0.0,
+    )
+    truncated = out_of_spins = False
+
+    for offset in range(0, model.users, chunk_size):
+        if out_of_spins:
+            break
+        n = min(chunk_size, model.users - offset)
+
+        pending = np.full(n, model.starting_spins, dtype=np.int64)
+        totals["starting"] += int(pending.sum())
+
+        cpa_spins, tasks, revenue = _cpa_rewards(rng, n, model)
+        pending += cpa_spins
+        totals["tasks"] += int(cpa_spins.sum())
+        totals["revenue"] += revenue
+
+        if model.referral_rate > 0:
+            # A referred user qualifies their referrer on first task; bonus lands on a random user
+            qualified = int(((rng.random(n) < model.referral_rate) & (tasks > 0)).sum())
+            if qualified:
+                referrers = rng.integers(0, n, size=qualified)
+                pending += np.bincount(referrers, minlength=n) * REFERRAL_BONUS_SPINS
+                totals["referrals"] += qualified * REFERRAL_BONUS_SPINS
+
+        points = np.zeros(n, dtype=np.float64)
+        buyers = rng.random(n) < model.buy_rate
+
+        rounds = 0
+        while True:
+            # Spend every pending spin; wins become the next round's pending spins
+            while pending.any():
+                rounds += 1
+                if rounds > max_rounds:
+                    truncated = True
+                    break
+                active = np.flatnonzero(pending)
+                counts = pending[active]
+                if max_spins is not None and totals["spins"] + int(counts.sum()) > max_spins:
+                    truncated = out_of_spins = True
+                    break
+
+                won_spins = np.zeros(n, dtype=np.int64)
+                won_points = np.zeros(n, dtype=np.float64)
+                for users, batch_counts in _spin_batches(active, counts, spin_batch):
+                    owner = np.repeat(users, batch_counts)
+                    if total_weight > 0:
+                        draws = rng.integers(0, total_weight, size=owner.size)
+                        outcome = np.searchsorted(cumulative, draws, side="right")
+                    else:
+                        outcome = np.full(owner.size, len(wheel.prizes) - 1)
+
+                    totals["spins"] += int(owner.size)
+                    prize_counts += np.bincount(outcome, minlength=len(wheel.prizes))
+                    won_spins += np.bincount(owner, weights=spin_values[outcome], minlength=n).astype(np.int64)
+                    won_points += np.bincount(owner, weights=point_values[outcome], minlength=n)
+
+                totals["prizes"] += int(won_spins.sum())
+                totals["points_awarded"] += float(won_points.sum())
+
+                pending[:] = won_spins
+                points += won_points
+
+            if truncated:
+                break
+
+            # Buy-spins conversion for users who opt in
+            bought = np.where(buyers, np.floor(points / cost), 0).astype(np.int64)
+            if not bought.any():
+                break
+            points -= bought * cost
+            pending = bought
+            totals["bought"] += int(bought.sum())
+            totals["points_spent"] += float(bought.sum()) * cost
+
+        totals["points_outstanding"] += float(points.sum())
+
+    jackpots = int(prize_counts[is_item].sum())
+    spins = totals["spins"]
+    item_liability = sum(
+        int(prize_counts[i]) * model.item_values.get(p.prize_value, 0.0)
+        for i, p in enumerate(wheel.prizes) if p.prize_type == "item"
+    )
+    points_liability = totals["points_outstanding"] * model.point_value
+    total_liability = item_liability + points_liability
+
+    return SimulationReport(
+        tier=wheel.tier,
+        version=wheel.version,
+        users=model.users,
+        total_spins=spins,
+        spins_starting=totals["starting"],
+        spins_from_tasks=totals["tasks"],
+        spins_from_referrals=totals["referrals"],
+        spins_from_prizes=totals["prizes"],
+        spins_bought=totals["bought"],
+        points_awarded=totals["points_awarded"],
+        points_spent=totals["points_spent"],
+        points_outstanding=totals["points_outstanding"],
+        expected_points_per_spin=totals["points_awarded"] / spins if spins else 0.0,
+        expected_spins_per_spin=totals["prizes"] / spins if spins else 0.0,
+        prize_counts={
+            f"{p.prize_type}:{p.prize_value}@{p.angle}": int(prize_counts[i]) for i, p in enumerate(wheel.prizes)
+        },
+        jackpots=jackpots,
+        jackpot_rate=jackpots / spins if spins else 0.0,
+        jackpot_rate_ci95=wilson_interval(jackpots, spins),
+        cpa_revenue=totals["revenue"],
+        item_liability=item_liability,
+        points_liability=points_liability,
+        total_liability=total_liability,
+        margin=totals["revenue"] - total_liability,
+        truncated=truncated,
+        elapsed_seconds=time.perf_counter() - started,
+    )
+
+
+async def _load_wheel(tier: str) -> Optional[wheels.CompiledWheel]:
+    async with AsyncSessionLocal() as db:
+        await wheels.registry.refresh(db, force=True)
+    return wheels.registry.get(tier)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the wheel economy")
+    parser.add_argument("--tier", default=wheels.DEFAULT_TIER, help="Live tier to load from the DB")
+    parser.add_argument("--config", help="JSON file in the POST /admin/wheels/{tier} format, instead of the DB")
+    parser.add_argument("--users", type=int, default=PopulationModel.users)
+    parser.add_argument("--starting-spins", type=int, default=PopulationModel.starting_spins)
+    parser.add_argument("--tasks-per-user", type=float, default=PopulationModel.tasks_per_user)
+    parser.add_argument("--mean-payout", type=float, default=PopulationModel.mean_payout)
+    parser.add_argument("--referral-rate", type=float, default=PopulationModel.referral_rate)
+    parser.add_argument("--buy-rate", type=float, default=PopulationModel.buy_rate)
+    parser.add_argument("--point-value", type=float, default=PopulationModel.point_value)
+    parser.add_argument("--item-value", action="append", default=[], metavar="NAME=USD")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--spin-batch", type=int, default=2_000_000, help="Max spins drawn per NumPy batch")
+    parser.add_argument("--max-spins", type=int, help="Stop (truncated) after this many spins")
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config) as f:
+            raw = json.load(f)
+        prizes = [(p["prize_type"], p["prize_value"], p["probability"], p["angle"]) for p in raw["prizes"]]
+        wheel = wheels.compile_wheel(
+            args.tier, 0, prizes,
+            raw.get("cost_per_spin", wheels.DEFAULT_COST_PER_SPIN), raw.get("required_tasks", 0)
+        )
+    else:
+        wheel = asyncio.run(_load_wheel(args.tier))
+        if not wheel:
+            parser.error(f"Unknown tier: {args.tier}")
+
+    item_values = {}
+    for item in args.item_value:
+        name, _, value = item.partition("=")
+        item_values[name] = float(value)
+
+    model = PopulationModel(
+        users=args.users,
+        starting_spins=args.starting_spins,
+        tasks_per_user=args.tasks_per_user,
+        mean_payout=args.mean_payout,
+        referral_rate=args.referral_rate,
+        buy_rate=args.buy_rate,
+        point_value=args.point_value,
+        item_values=item_values,
+    )
+    report = simulate(
+        wheel, model, seed=args.seed, chunk_size=args.chunk_size, spin_batch=args.spin_batch, max_spins=args.max_spins
+    )
+    print(json.dumps(report.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
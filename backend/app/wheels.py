@@ -0,0 +1,206 @@
+"""
+Versioned wheel configurations.
+
+Prize tables are stored per tier in the `wheels` table. Every worker keeps a compiled snapshot
+of the latest version of each tier in memory and swaps it atomically when the `wheels` row in
+`config_versions` changes, so the spin path never reads the config from the DB.
+"""
+import asyncio
+import dataclasses
+import logging
+import math
+import secrets
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from app import crud, shared
+from app.database import AsyncSessionLocal
+
+DEFAULT_TIER = "standard"
+
+# Integer weights avoid float drift when picking a prize
+PROB_SCALE = 1_000_000
+
+# Built-in wheel used until a standard version is published
+# Format: (Type, Value, Probability, Angle)
+DEFAULT_PRIZES = [
+    ("spins", "1", 0.3, 0),
+    ("points", "100", 0.3, 45),
+    ("points", "500", 0.2, 90),
+    ("spins", "5", 0.1, 135),
+    ("item", "iphone", 0.001, 180), # Jackpot
+    ("points", "50", 0.099, 225),
+    ("spins", "2", 0.0, 270), # Placeholder
+    ("points", "1000", 0.0, 315) # Placeholder
+]
+
+DEFAULT_COST_PER_SPIN = 1000
+
+
+@dataclass(frozen=True)
+class Prize:
+    prize_type: str
+    prize_value: str
+    probability: float
+    angle: int
+
+
+@dataclass(frozen=True)
+class CompiledWheel:
+    tier: str
+    version: int # 0 for the built-in default
+    prizes: Tuple[Prize, ...]
+    cumulative: Tuple[int, ...] # Running sum of integer weights, one per prize
+    cost_per_spin: int
+    required_tasks: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.cumulative[-1] if self.cumulative else 0
+
+    def pick(self) -> Prize:
+        """
+        Secure RNG-based prize selection. Falls back to the last prize if all weights are zero.
+        """
+        if self.total <= 0:
+            return self.prizes[-1]
+        r = secrets.randbelow(self.total)
+        return self.prizes[bisect_right(self.cumulative, r)]
+
+
+def compile_wheel(
+    tier: str,
+    version: int,
+    prizes: Iterable[Tuple[str, str, float, int]],
+    cost_per_spin: int = DEFAULT_COST_PER_SPIN,
+    required_tasks: int = 0,
+) -> CompiledWheel:
+    """
+    Validate a prize table and precompute its cumulative weights.
+    Raises ValueError if the table cannot be served.
+    """
+    compiled = tuple(Prize(str(t), str(v), float(p), int(a) % 360) for t, v, p, a in prizes)
+    if not compiled:
+        raise ValueError("Wheel must have at least one prize")
+
+    cumulative = []
+    total = 0
+    for prize in compiled:
+        if prize.probability < 0:
+            raise ValueError("Prize probabilities must be non-negative")
+        # Spin and point prizes are applied arithmetically, reject values we can't apply
+        if prize.prize_type == "spins" and (not prize.prize_value.isdigit() or int(prize.prize_value) < 0):
+            raise ValueError(f"Invalid spins prize value: {prize.prize_value}")
+        if prize.prize_type == "points":
+            try:
+                points = float(prize.prize_value)
+            except ValueError:
+                points = -1.0
+            if not math.isfinite(points) or points < 0:
+                raise ValueError(f"Invalid points prize value: {prize.prize_value}")
+        total += int(prize.probability * PROB_SCALE)
+        cumulative.append(total)
+
+    if total > PROB_SCALE:
+        raise ValueError("Prize probabilities must not sum to more than 1")
+
+    return CompiledWheel(
+        tier=tier,
+        version=version,
+        prizes=compiled,
+        cumulative=tuple(cumulative),
+        cost_per_spin=cost_per_spin,
+        required_tasks=required_tasks,
+    )
+
+
+def compile_db_wheel(wheel) -> CompiledWheel:
+    prizes = [(p["prize_type"], p["prize_value"], p["probability"], p["angle"]) for p in wheel.prizes]
+    cost_per_spin = wheel.cost_per_spin or DEFAULT_COST_PER_SPIN
+    return compile_wheel(wheel.tier, wheel.version, prizes, cost_per_spin, wheel.required_tasks or 0)
+
+
+DEFAULT_WHEEL = compile_wheel(DEFAULT_TIER, 0, DEFAULT_PRIZES, DEFAULT_COST_PER_SPIN)
+
+
+class WheelRegistry:
+    """
+    In-process snapshot of all live wheels, keyed by tier.
+    The whole dict is replaced on reload, so readers always see one consistent version.
+    """
+
+    def __init__(self):
+        self._wheels: Dict[str, CompiledWheel] = {DEFAULT_TIER: DEFAULT_WHEEL}
+        self._version: Optional[int] = None
+        self._wake = asyncio.Event()
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    def get(self, tier: str = DEFAULT_TIER) -> Optional[CompiledWheel]:
+        return self._wheels.get(tier)
+
+    def all(self) -> Dict[str, CompiledWheel]:
+        return self._wheels
+
+    async def refresh(self, db, force: bool = False) -> bool:
+        """
+        Reload wheels if the config version moved. Returns True if a new snapshot was installed.
+        """
+        version = await crud.get_config_version(db, crud.WHEELS_CONFIG)
+        if not force and version == self._version:
+            return False
+
+        wheels: Dict[str, CompiledWheel] = {}
+        for db_wheel in await crud.get_latest_wheels(db):
+            if not db_wheel.is_active:
+                if db_wheel.tier == DEFAULT_TIER:
+                    # publish_wheel refuses this now; older rows may still have it
+                    logging.warning(f"Standard wheel version {db_wheel.version} is inactive, serving the built-in wheel")
+                continue
+            try:
+                wheels[db_wheel.tier] = compile_db_wheel(db_wheel)
+            except (ValueError, KeyError, TypeError):
+                # Keep serving the previous snapshot of this tier rather than dropping it
+                logging.exception(f"Invalid wheel config: tier={db_wheel.tier} version={db_wheel.version}")
+                if db_wheel.tier in self._wheels:
+                    wheels[db_wheel.tier] = self._wheels[db_wheel.tier]
+        standard = wheels.setdefault(DEFAULT_TIER, DEFAULT_WHEEL)
+        # Spins are one balance bought at the standard price (see buy_spins); other tiers report that price
+        for tier, wheel in wheels.items():
+            if wheel.cost_per_spin != standard.cost_per_spin:
+                wheels[tier] = dataclasses.replace(wheel, cost_per_spin=standard.cost_per_spin)
+
+        self._wheels = wheels
+        self._version = version
+        logging.info(f"Wheel config loaded: version={version} tiers={sorted(wheels)}")
+        return True
+
+    def wake(self):
+        """
+        Check the version row now instead of at the next poll (a publish was broadcast).
+        """
+        self._wake.set()
+
+    async def poll(self, interval: float):
+        """
+        Background loop: check the single version row every `interval` seconds, or when woken.
+        """
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.refresh(db)
+            except Exception:
+                logging.exception("Wheel config refresh failed")
+
+
+registry = WheelRegistry()
+shared.state.on_invalidate("wheels", registry.wake)
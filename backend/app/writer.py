@@ -0,0 +1,133 @@
+"""
+Single-writer actor for SQLite deployments.
+
+With WRITE_ACTOR_ENABLED, mutating operations are submitted as commands to one writer coroutine
+that owns a single connection. Each tick it drains the queued commands, runs each one in its own
+SAVEPOINT inside a single transaction, commits once and resolves every caller's future. File lock
+contention between sessions becomes batching. Reads keep using the regular pool.
+
+When the actor is not running (disabled, or another process such as the bot) commands run inline
+on the caller's session and are committed there.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+
+# A command receives the session to write with; it must not commit
+Command = Callable[..., Awaitable[Any]]
+
+
+class WriteActor:
+    def __init__(self, max_batch: int = 256, queue_size: int = 10_000):
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._engine = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _create_engine(self):
+        engine = create_async_engine(
+            settings.DATABASE_URL, echo=settings.SQL_ECHO, pool_size=1, max_overflow=0
+        )
+        if engine.dialect.name == "sqlite":
+            # Let SQLAlchemy drive transactions so SAVEPOINTs work, and take the write lock
+            # up front instead of failing on lock upgrade mid-batch
+            @event.listens_for(engine.sync_engine, "connect")
+            def _disable_driver_transactions(dbapi_connection, connection_record):
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(engine.sync_engine, "begin")
+            def _begin_immediate(conn):
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+        return engine
+
+    def start(self) -> asyncio.Task:
+        self._engine = self._create_engine()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Fail anything still queued rather than leaving callers hanging
+        while self._queue and not self._queue.empty():
+            _, _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Write actor stopped"))
+        if self._engine:
+            await self._engine.dispose()
+            self._engine = None
+
+    async def submit(self, fn: Command, *args, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        # Blocks when the queue is full, which backpressures writers
+        await self._queue.put((fn, args, kwargs, future))
+        return await future
+
+    async def _run(self):
+        Session = sessionmaker(bind=self._engine, class_=AsyncSession, expire_on_commit=False)
+        async with Session() as session:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.max_batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self._run_batch(session, batch)
+
+    async def _run_batch(self, session: AsyncSession, batch):
+        outcomes = []
+        try:
+            for fn, args, kwargs, future in batch:
+                if future.done():
+                    # Caller went away before we got to it
+                    continue
+                try:
+                    async with session.begin_nested():
+                        result = await fn(session, *args, **kwargs)
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    # Only this command's savepoint is rolled back
+                    outcomes.append((future, None, e))
+            await session.commit()
+        except Exception as e:
+            logging.exception(f"Write actor batch of {len(batch)} failed")
+            await session.rollback()
+            outcomes = [(future, None, e) for _, _, _, future in batch]
+        finally:
+            # Results are handed to other sessions' callers; don't keep them in our identity map
+            session.expunge_all()
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+actor = WriteActor(max_batch=settings.WRITE_ACTOR_MAX_BATCH, queue_size=settings.WRITE_ACTOR_QUEUE_SIZE)
+
+
+async def run(db: AsyncSession, fn: Command, *args, **kwargs):
+    """
+    Execute a write command and commit it: through the actor when it is running,
+    otherwise on the caller's session.
+    """
+    if actor.running:
+        return await actor.submit(fn, *args, **kwargs)
+    result = await fn(db, *args, **kwargs)
+    await db.commit()
+    return result
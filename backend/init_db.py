@@ -1,6 +1,7 @@
 import asyncio
 from app.database import engine, AsyncSessionLocal
-from app.models import Task, Base
+from app.models import Task
+from app import migrations
 from sqlalchemy.future import select
 
 async def init_data():
@@ -48,11 +49,9 @@ async def init_data():
             print("Tasks already present; no changes.")
 
 async def main():
-    # Create tables if main.py didn't run, but main.py startup event usually handles it.
-    # We'll assume tables exist or just trigger creation here too just in case
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        
+    # Bring the schema up to date (same as `python -m app.migrations`), then seed
+    await migrations.upgrade(engine)
+
     await init_data()
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.config and app.database read the environment at import, so point them at a throwaway
+# SQLite file before any test imports app. Always overridden: tests must never reach a real DB.
+_scratch = tempfile.mkdtemp(prefix="wheel-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_scratch, 'test.db')}"
+# Set empty rather than unset, so a developer's backend/.env can't fill them in
+for name in ("DATABASE_READ_URL", "REDIS_URL", "POSTBACK_NETWORKS", "ABUSE_RULES", "ADMIN_IDS"):
+    os.environ[name] = ""
+os.environ["ARCHIVE_DIR"] = os.path.join(_scratch, "archive")
+os.environ.setdefault("BOT_TOKEN", "1:test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["CPA_SECRET_TOKEN"] = "test-postback-token"
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+
+@pytest.fixture
+def run():
+    """
+    Run a coroutine on a fresh event loop (no pytest-asyncio here). The engines' pooled aiosqlite
+    connections are bound to the loop that opened them, so they are disposed before it closes.
+    """
+    from app import migrations
+    from app.database import engine, read_engine
+
+    def _run(coro):
+        async def main():
+            try:
+                await migrations.upgrade(engine)
+                return await coro
+            finally:
+                await engine.dispose()
+                await read_engine.dispose()
+
+        return asyncio.run(main())
+
+    return _run
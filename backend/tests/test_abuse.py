@@ -0,0 +1,53 @@
+"""
+Sliding-window abuse detector (app.abuse): limits, blocks and their expiry.
+"""
+from app import abuse
+
+
+def detector(limit=3, window=60.0, block_seconds=30.0, soft_block=True):
+    rules = abuse.compile_rules(f'{{"spin_user": [{limit}, {window}]}}')
+    return abuse.AbuseDetector(rules, max_keys=100, block_seconds=block_seconds, soft_block=soft_block)
+
+
+def test_sliding_window_counts_within_the_window():
+    window = abuse.SlidingWindow()
+    ticks = [0, 1, 5, abuse.BUCKETS - 1]
+    assert [window.add(t) for t in ticks] == [1, 2, 3, 4]
+    # One bucket later the events of tick 0 have left the window
+    assert window.add(abuse.BUCKETS) == 4
+    # A full window later everything has
+    assert window.add(3 * abuse.BUCKETS) == 1
+
+
+def test_limit_blocks_then_unblocks(run):
+    d = detector(limit=3, window=60.0, block_seconds=30.0)
+
+    async def hits(times, key=1):
+        return [await d.allow(("spin_user", key), now=t) for t in times]
+
+    async def scenario():
+        burst = await hits([100.0, 100.1, 100.2, 100.3])
+        other_key = await hits([100.4], key=2)
+        blocked = await hits([110.0, 129.0])
+        # Block over, and the burst has slid out of the window
+        after = await hits([200.0, 200.1])
+        return burst, other_key, blocked, after
+
+    burst, other_key, blocked, after = run(scenario())
+    assert burst == [True, True, True, False]
+    assert other_key == [True]
+    assert blocked == [False, False]
+    assert after == [True, True]
+    assert [f["count"] for f in d._pending] == [4]
+
+
+def test_flag_only_mode_never_refuses(run):
+    d = detector(limit=1, soft_block=False)
+
+    async def scenario():
+        return [await d.allow(("spin_user", 1), ("spin_user", None), now=10.0 + i) for i in range(5)]
+
+    assert run(scenario()) == [True] * 5
+    # Flagged once, not on every event while the flag is live
+    assert len(d._pending) == 1
+    assert d._pending[0]["blocked"] is False
@@ -0,0 +1,48 @@
+"""
+Admin export streaming (GET /admin/export/{table}).
+"""
+import asyncio
+
+from app import crud, schemas
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+
+ADMIN_ID = 880_101
+
+
+def test_export_holds_no_auth_connection_while_streaming(run, monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(settings, "ADMIN_IDS", str(ADMIN_ID))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/admin/export/users", "raw_path": b"/admin/export/users", "root_path": "", "query_string": b"",
+        "headers": [(b"x-telegram-id", str(ADMIN_ID).encode())], "client": ("127.0.0.1", 0), "server": ("test", 80),
+    }
+    status, checked_out, body = [], [], []
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # Client stays connected; the response cancels this wait when it is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message.get("body"):
+            checked_out.append(engine.pool.checkedout())
+            body.append(message["body"])
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            if not await crud.get_user_by_telegram_id(db, ADMIN_ID):
+                await crud.create_user(db, schemas.UserCreate(telegram_id=ADMIN_ID))
+        await app(scope, receive, send)
+
+    run(scenario())
+    assert status == [200]
+    assert str(ADMIN_ID).encode() in b"".join(body)
+    # Only the export's own read session
+    assert max(checked_out) == 1
@@ -0,0 +1,123 @@
+"""
+Idempotency-Key replay, parameter mismatch and reuse of an expired key (app.idempotency).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func, update
+from sqlalchemy.future import select
+
+from app import idempotency, models
+from app.database import AsyncSessionLocal
+
+
+class Result(BaseModel):
+    value: int
+
+
+def command(calls):
+    async def fn(db):
+        calls.append(1)
+        return Result(value=len(calls))
+
+    return fn
+
+
+async def execute(store, key, fn, **params):
+    async with AsyncSessionLocal() as db:
+        return await store.execute(db, key, fn, request_fingerprint=idempotency.fingerprint(**params))
+
+
+def test_replay_runs_command_once(run):
+    store, calls = idempotency.IdempotencyStore(100, 60), []
+
+    async def scenario():
+        first = await execute(store, "test:replay", command(calls), amount=1)
+        second = await execute(store, "test:replay", command(calls), amount=1)
+        store._cache.clear()
+        third = await execute(store, "test:replay", command(calls), amount=1)
+        return first, second, third
+
+    (first, replayed), second, third = run(scenario())
+    assert (first.value, replayed) == (1, False)
+    assert second == third == ({"value": 1}, True)
+    assert len(calls) == 1
+
+
+def test_key_reused_with_other_parameters_is_rejected(run):
+    store, calls = idempotency.IdempotencyStore(100, 60), []
+
+    async def scenario():
+        await execute(store, "test:mismatch", command(calls), amount=1)
+        store._cache.clear()
+        await execute(store, "test:mismatch", command(calls), amount=2)
+
+    with pytest.raises(HTTPException) as exc:
+        run(scenario())
+    assert exc.value.status_code == 422
+    assert len(calls) == 1
+
+
+def test_expired_key_is_replaced(run):
+    store, calls = idempotency.IdempotencyStore(100, 60), []
+
+    async def scenario():
+        await execute(store, "test:expired", command(calls), amount=1)
+        # Past the TTL, not yet purged
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.IdempotencyKey)
+                .where(models.IdempotencyKey.key == "test:expired")
+                .values(created_at=datetime.utcnow() - timedelta(days=3))
+            )
+            await db.commit()
+        store._cache.clear()
+        result = await execute(store, "test:expired", command(calls), amount=2)
+        async with AsyncSessionLocal() as db:
+            row = await db.get(models.IdempotencyKey, "test:expired")
+            rows = await db.scalar(
+                select(func.count()).select_from(models.IdempotencyKey).where(models.IdempotencyKey.key == "test:expired")
+            )
+        return result, row, rows
+
+    (result, replayed), row, rows = run(scenario())
+    assert (result.value, replayed) == (2, False)
+    assert rows == 1
+    assert row.response == {"value": 2}
+    assert row.created_at > datetime.utcnow() - timedelta(minutes=1)
+
+
+def test_spin_retry_skips_burst_limit(run, monkeypatch):
+    from starlette.requests import Request
+
+    from app import abuse, crud, schemas, wheels
+    from app.routers import game
+
+    # One fresh spin per minute; retries of it must still replay
+    detector = abuse.AbuseDetector(abuse.compile_rules('{"spin_user": [1, 60]}'), 100, 60, soft_block=True)
+    monkeypatch.setattr(abuse, "detector", detector)
+    request = Request({"type": "http", "client": ("203.0.113.9", 1), "headers": []})
+    telegram_id = 880_001
+
+    async def spin(key):
+        async with AsyncSessionLocal() as db:
+            return await game.spin_wheel(request, telegram_id, wheels.DEFAULT_TIER, key, db)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await crud.create_user(db, schemas.UserCreate(telegram_id=telegram_id))
+            await db.execute(update(models.User).where(models.User.telegram_id == telegram_id).values(spins=10))
+            await db.commit()
+        first = await spin("burst")
+        idempotency.store._cache.clear()
+        retries = [await spin("burst") for _ in range(3)]
+        try:
+            await spin("another")
+        except HTTPException as e:
+            return first, retries, e.status_code
+
+    first, retries, status = run(scenario())
+    assert all(r == first.model_dump(mode="json") for r in retries)
+    assert status == 429
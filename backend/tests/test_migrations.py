@@ -0,0 +1,50 @@
+"""
+Schema migrations (app.migrations) on a database of their own.
+"""
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import migrations
+
+
+def test_upgrade_from_baseline_is_idempotent(run, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrate.db'}")
+
+    async def scenario():
+        try:
+            baseline = await migrations.upgrade(engine, target=1)
+            version_at_baseline = await migrations.schema_version(engine)
+            rest = await migrations.upgrade(engine)
+            again = await migrations.upgrade(engine)
+            # Steps must also hold up when re-run against a schema that already has their changes
+            async with engine.begin() as conn:
+                for migration in migrations.MIGRATIONS:
+                    await conn.run_sync(migration.upgrade)
+                tables = await conn.run_sync(lambda c: set(inspect(c).get_table_names()))
+            return baseline, version_at_baseline, rest, again, await migrations.schema_version(engine), tables
+        finally:
+            await engine.dispose()
+
+    baseline, version_at_baseline, rest, again, version, tables = run(scenario())
+    assert [m.version for m in baseline] == [1]
+    assert version_at_baseline == 1
+    assert [m.version for m in rest] == [m.version for m in migrations.MIGRATIONS[1:]]
+    assert again == []
+    assert version == migrations.LATEST
+    assert {"abuse_flags", "archive_partition_users", "schema_migrations"} <= tables
+
+
+def test_old_schema_refuses_to_boot(run, tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    monkeypatch.setattr(migrations.settings, "MIGRATE_ON_STARTUP", False)
+
+    async def scenario():
+        try:
+            await migrations.upgrade(engine, target=2)
+            await migrations.ensure_current(engine)
+        finally:
+            await engine.dispose()
+
+    with pytest.raises(RuntimeError, match="python -m app.migrations"):
+        run(scenario())
@@ -0,0 +1,63 @@
+"""
+Postback gateway checks (app.postbacks): allowlist, token, timestamp and signature rejections.
+"""
+import ipaddress
+import json
+
+import pytest
+
+from app import postbacks
+
+SECRET = "s3cret"
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def network():
+    config = {"cpagrip": {"cidrs": ["203.0.113.0/24", "2001:db8::/32"], "token": "tok-12345", "hmac_secret": SECRET}}
+    return postbacks.compile_networks(json.dumps(config))["cpagrip"]
+
+
+def signed(**params):
+    params = {"password": "tok-12345", "ts": str(int(NOW)), **params}
+    params["signature"] = postbacks.sign(SECRET.encode(), params)
+    return params
+
+
+def ip(address):
+    return ipaddress.ip_address(address)
+
+
+def test_valid_postback_passes(network):
+    assert postbacks.check(network, ip("203.0.113.7"), signed(offer_id="1"), NOW) is None
+    assert postbacks.check(network, ip("2001:db8::1"), signed(offer_id="1"), NOW) is None
+    # IPv4 clients seen through a dual-stack socket
+    assert postbacks.check(network, ip("::ffff:203.0.113.7"), signed(offer_id="1"), NOW) is None
+
+
+@pytest.mark.parametrize("address", ["198.51.100.1", "2001:db9::1", None])
+def test_ip_outside_allowlist_is_rejected(network, address):
+    assert postbacks.check(network, address and ip(address), signed(offer_id="1"), NOW) == "ip"
+
+
+def test_wrong_token_is_rejected(network):
+    params = signed(offer_id="1", password="tok-99999")
+    assert postbacks.check(network, ip("203.0.113.7"), params, NOW) == "token"
+
+
+@pytest.mark.parametrize("ts", [str(int(NOW) - 301), str(int(NOW) + 301), "nan", "inf", "", "soon"])
+def test_bad_timestamp_is_rejected(network, ts):
+    assert postbacks.check(network, ip("203.0.113.7"), signed(offer_id="1", ts=ts), NOW) == "timestamp"
+
+
+def test_tampered_or_missing_signature_is_rejected(network):
+    params = signed(offer_id="1", payout="1.0")
+    params["payout"] = "100.0"
+    assert postbacks.check(network, ip("203.0.113.7"), params, NOW) == "signature"
+    del params["signature"]
+    assert postbacks.check(network, ip("203.0.113.7"), params, NOW) == "signature"
+
+
+def test_unknown_network_fails_the_boot():
+    with pytest.raises(ValueError):
+        postbacks.compile_networks('{"nope": {}}')
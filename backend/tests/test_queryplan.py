@@ -0,0 +1,19 @@
+"""
+Query-plan regression check (app.queryplan) for the hot endpoints, on a scratch SQLite file.
+"""
+from app import queryplan
+from app.config import settings
+
+
+def test_hot_paths_within_budget_and_indexed(run):
+    admin_ids = settings.ADMIN_IDS
+    reports = run(queryplan.check())
+
+    assert settings.ADMIN_IDS == admin_ids
+    assert {r.name for r in reports} == {hot.name for hot in queryplan.hot_paths()}
+    failures = [
+        f"{r.name}: status={r.status} statements={r.statements}/{r.budget} "
+        f"problems={[p for f in r.findings for p in f.problems]}"
+        for r in reports if not r.ok
+    ]
+    assert not failures, "\n".join(failures)
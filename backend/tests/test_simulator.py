@@ -0,0 +1,46 @@
+"""
+Wheel simulator batching (app.simulator): spins are drawn in bounded batches whatever the
+per-user spin counts, and a run stops at max_spins.
+"""
+import numpy as np
+
+from app import simulator, wheels
+
+
+def points_wheel(points: str = "1"):
+    return wheels.compile_wheel("test", 1, [("points", points, 1.0, 0)], cost_per_spin=10)
+
+
+def test_spin_batches_cut_on_cumulative_spins():
+    users = np.array([3, 5, 8, 9])
+    counts = np.array([4, 25, 1, 6])
+
+    batches = list(simulator._spin_batches(users, counts, 10))
+
+    assert all(int(c.sum()) <= 10 for _, c in batches)
+    drawn = {}
+    for batch_users, batch_counts in batches:
+        for user, count in zip(batch_users.tolist(), batch_counts.tolist()):
+            drawn[user] = drawn.get(user, 0) + count
+    assert drawn == {3: 4, 5: 25, 8: 1, 9: 6}
+
+
+def test_batch_size_does_not_change_the_economy():
+    model = simulator.PopulationModel(users=50, starting_spins=100, tasks_per_user=0)
+
+    whole = simulator.simulate(points_wheel(), model, seed=1)
+    batched = simulator.simulate(points_wheel(), model, seed=1, spin_batch=7)
+
+    # 100 spins -> 100 points -> 10 bought spins -> 10 points -> 1 bought spin -> 1 point
+    assert whole.total_spins == batched.total_spins == 50 * 111
+    assert whole.points_outstanding == batched.points_outstanding == 50.0
+    assert not batched.truncated
+
+
+def test_max_spins_truncates_the_run():
+    model = simulator.PopulationModel(users=1000, starting_spins=100, tasks_per_user=0)
+
+    report = simulator.simulate(points_wheel(), model, seed=1, chunk_size=100, max_spins=25_000)
+
+    assert report.truncated
+    assert report.total_spins <= 25_000
@@ -0,0 +1,59 @@
+"""
+Wheel registry snapshots and tier publishing rules (app.wheels, POST /admin/wheels/{tier}).
+"""
+import logging
+
+import pytest
+from fastapi import HTTPException
+
+from app import models, schemas, wheels
+from app.database import AsyncSessionLocal
+from app.routers import admin
+
+PRIZES = [{"prize_type": t, "prize_value": v, "probability": p, "angle": a} for t, v, p, a in wheels.DEFAULT_PRIZES]
+
+
+async def refreshed(*rows):
+    """
+    Snapshot of a fresh registry over the given wheel rows; they are rolled back afterwards.
+    """
+    registry = wheels.WheelRegistry()
+    async with AsyncSessionLocal() as db:
+        for tier, version, cost, active in rows:
+            db.add(models.Wheel(tier=tier, version=version, prizes=PRIZES, cost_per_spin=cost, is_active=active))
+        await db.flush()
+        await registry.refresh(db, force=True)
+        await db.rollback()
+    return registry
+
+
+def test_other_tiers_are_priced_by_the_standard_wheel(run):
+    registry = run(refreshed(("standard", 900, 250, True), ("gold_test", 900, 5000, True)))
+
+    assert registry.get().cost_per_spin == 250
+    assert registry.get("gold_test").cost_per_spin == 250
+
+
+def test_inactive_standard_falls_back_with_a_warning(run, caplog):
+    with caplog.at_level(logging.WARNING):
+        registry = run(refreshed(("standard", 900, 250, False)))
+
+    assert registry.get() is wheels.DEFAULT_WHEEL
+    assert "inactive" in caplog.text
+
+
+@pytest.mark.parametrize("tier, changes, detail", [
+    ("standard", {"is_active": False}, "can't be deactivated"),
+    ("gold_test", {"cost_per_spin": 5000}, "only be set on the standard tier"),
+])
+def test_publish_rejects(run, tier, changes, detail):
+    payload = schemas.WheelPublish(prizes=PRIZES, **changes)
+
+    async def publish():
+        async with AsyncSessionLocal() as db:
+            await admin.publish_wheel(tier, payload, db, admin=None)
+
+    with pytest.raises(HTTPException) as exc:
+        run(publish())
+    assert exc.value.status_code == 400
+    assert detail in exc.value.detail
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from app.database import AsyncSessionLocal
-from app import crud, schemas
+from app import crud, schemas, abuse
 from app.models import Referral
 from bot.keyboards import get_main_menu_keyboard
 from app.config import settings
@@ -55,8 +55,10 @@ async def command_start_handler(message: Message, command: CommandObject):
             user = await crud.create_user(db, user_create)
             logging.info(f"New user created: {telegram_id}")
             
-            # Handle Referral
-            if referrer_id and referrer_id != user.id:
+            # Handle Referral (bursts of sign-ups under one referrer earn nothing while soft-blocked)
+            if referrer_id and referrer_id != user.id and not await abuse.detector.allow(("referral", referrer_id)):
+                logging.warning(f"Referral skipped, referrer {referrer_id} is soft-blocked")
+            elif referrer_id and referrer_id != user.id:
                 # Check if referrer exists
                 referrer = await crud.get_user(db, referrer_id)
                 if referrer:
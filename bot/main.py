@@ -39,6 +39,8 @@ except ImportError:
     from handlers import router
 
 from app.config import settings
+from app import outbox, reminders, idempotency, archive, abuse, shared
+from app.scheduler import Scheduler
 
 async def main() -> None:
     # Initialize Bot instance with default bot properties which will be passed to all API calls
@@ -48,7 +50,29 @@ async def main() -> None:
     dp = Dispatcher()
     dp.include_router(router)
 
-    await dp.start_polling(bot)
+    # Shared with the API workers, e.g. referral blocks set by either side
+    await shared.state.start(settings.REDIS_URL)
+
+    # Periodic jobs; this process is the single instance that runs them
+    scheduler = Scheduler()
+    scheduler.add_job(reminders.JOB_NAME, settings.REMINDER_SCAN_SECONDS, reminders.enqueue_inactive_reminders)
+    scheduler.add_job("idempotency_purge", settings.IDEMPOTENCY_PURGE_SECONDS, idempotency.purge_expired)
+    scheduler.add_job(outbox.PURGE_JOB_NAME, settings.OUTBOX_PURGE_SECONDS, outbox.purge_finished)
+    scheduler.add_job(archive.JOB_NAME, settings.ARCHIVE_INTERVAL_SECONDS, archive.archive_old_rows)
+
+    # Deliver queued notifications (task rewards, referrals, reminders) alongside polling
+    background = [
+        asyncio.create_task(outbox.run_dispatcher(bot)),
+        asyncio.create_task(scheduler.run()),
+        asyncio.create_task(abuse.detector.run(settings.ABUSE_FLUSH_SECONDS)),
+    ]
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in background:
+            task.cancel()
+        await abuse.detector.flush()
+        await shared.state.stop()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
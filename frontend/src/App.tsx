@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react';
 import { BrowserRouter, Routes, Route } from 'react-router-dom';
 import WebApp from '@twa-dev/sdk';
-import { getUser } from './requests/api';
+import { getUser, subscribeUserEvents } from './requests/api';
 import { Wheel } from './components/Wheel';
 import { TaskList } from './components/TaskList';
 import { WinModal } from './components/WinModal';
@@ -22,9 +22,9 @@ function Game({ user, setUser }: { user: any, setUser: any }) {
     if (user) {
         setUser((prev: any) => ({ 
             ...prev, 
-            spins: result.remaining_spins 
+            spins: result.remaining_spins,
+            points: result.remaining_points
         }));
-        getUser(user.telegram_id).then(setUser);
       
       if (WebApp.HapticFeedback) {
         WebApp.HapticFeedback.notificationOccurred('success');
@@ -120,6 +120,21 @@ function MainApp() {
     init();
   }, []);
 
+  // Live balance updates (task rewards, admin credits, other devices)
+  const telegramId = user?.telegram_id;
+  useEffect(() => {
+    if (!telegramId) return;
+    const source = subscribeUserEvents(telegramId, (type, data) => {
+      if (type === 'spin') return; // Applied by the spin handler once the wheel stops
+      setUser((prev: any) => ({
+        ...prev,
+        spins: data.spins ?? prev.spins,
+        points: data.points ?? prev.points
+      }));
+    });
+    return () => source.close();
+  }, [telegramId]);
+
   if (loading) return <div className="loading-screen">Loading...</div>;
   if (!user) return <div className="error-screen">Failed to load user data.</div>;
 
@@ -22,8 +22,31 @@ export const getUser = async (telegram_id: number) => {
   }
 };
 
+// Server-pushed balance updates (SSE); replaces polling GET /users/{id}
+export const subscribeUserEvents = (telegram_id: number, onEvent: (type: string, data: any) => void) => {
+  const source = new EventSource(`${API_URL}/users/${telegram_id}/events`);
+  for (const type of ['balance', 'spin', 'task_completed']) {
+    source.addEventListener(type, (e) => onEvent(type, JSON.parse((e as MessageEvent).data)));
+  }
+  return source;
+};
+
+// Mutating game calls are retried on network errors with the same Idempotency-Key,
+// so a retry replays the stored result instead of spending twice
+const postIdempotent = async (url: string, attempts = 3) => {
+  const headers = { 'Idempotency-Key': crypto.randomUUID() };
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await api.post(url, null, { headers });
+    } catch (error: any) {
+      if (error.response || attempt >= attempts) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** (attempt - 1)));
+    }
+  }
+};
+
 export const spinWheel = async (telegram_id: number) => {
-  const response = await api.post(`/game/spin?telegram_id=${telegram_id}`);
+  const response = await postIdempotent(`/game/spin?telegram_id=${telegram_id}`);
   return response.data;
 };
 
@@ -33,7 +56,7 @@ export const getTasks = async () => {
 };
 
 export const buySpins = async (telegram_id: number, amount: number = 1) => {
-  const response = await api.post(`/game/buy_spins?telegram_id=${telegram_id}&amount=${amount}`);
+  const response = await postIdempotent(`/game/buy_spins?telegram_id=${telegram_id}&amount=${amount}`);
   return response.data;
 };
 